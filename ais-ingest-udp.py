@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+'''
+Ingest AIS sentences from UDP multicast (the pseudo AIS from LoRaGPS_base) and,
+optionally, from a real AIS receiver, and maintain a table of vessel positions.
+
+Datagrams may contain several sentences. Sockets are non-blocking with large
+receive buffers and are drained in batches. Duplicate sentences and duplicate
+positions (e.g. the same boat heard on two inputs) are dropped. Vessels that
+have not reported for --max_age seconds are evicted. Every --report seconds
+a summary is printed with counts of sentences, decoded positions, rejected
+sentences and datagrams dropped by the kernel (Linux only).
+
+  python3  ./ais-ingest-udp.py
+  python3  ./ais-ingest-udp.py --feed_udp=10110         # e.g. rtl-ais or AIS-catcher
+  python3  ./ais-ingest-udp.py --feed_tcp=192.168.1.20:10110
+  python3  ./ais-ingest-udp.py --out_group=224.1.1.5    # de-duplicated stream for OpenCPN
+
+As with ais-fake-rx-udp.py, the receiver and the sender should be on the same
+subnet, and --iface is the local system's IP address.
+The decoding is done by lib/AIS.py and the table by lib/vessels.py.
+'''
+
+import argparse
+import errno
+import selectors
+import socket
+import struct
+import sys
+import os
+from time import monotonic, strftime
+
+from vessels import VesselTable, AISingest
+
+parser = argparse.ArgumentParser(description=
+           'Ingest pseudo and real AIS over the network and keep a vessel table.')
+
+parser.add_argument('--mcast_groups', type=str, default='224.1.1.4',
+          help='Comma separated multicast groups to join. (default: "224.1.1.4")')
+
+parser.add_argument('--mcast_port', type=int, default=65433,
+          help='Network multicast port. (default: 65433)')
+
+parser.add_argument('--iface', type=str, default=None,
+          help='IP address of the local interface. (default: address of hostname)')
+
+parser.add_argument('--feed_udp', type=int, default=None,
+          help='UDP port on which a real AIS receiver sends sentences. (default: None)')
+
+parser.add_argument('--feed_tcp', type=str, default=None,
+          help='host:port of a real AIS receiver serving sentences by TCP. (default: None)')
+
+parser.add_argument('--out_group', type=str, default=None,
+          help='Multicast group for the de-duplicated output (default: None, no output).' +
+               ' This must not be one of mcast_groups.')
+
+parser.add_argument('--out_port', type=int, default=65433,
+          help='Port for the de-duplicated output. (default: 65433)')
+
+parser.add_argument('--mmsis', type=str, default=None,
+          help='Comma separated MMSIs. Only these vessels are decoded and kept.' +
+               ' (default: None, all vessels)')
+
+parser.add_argument('--rcvbuf', type=int, default=4*1024*1024,
+          help='Socket receive buffer size in bytes. The kernel may limit this' +
+               ' (see net.core.rmem_max). (default: 4194304)')
+
+parser.add_argument('--batch', type=int, default=512,
+          help='Maximum datagrams read from a socket before checking others. (default: 512)')
+
+parser.add_argument('--max_age', type=float, default=600.0,
+          help='Seconds after which a vessel without reports is evicted. (default: 600)')
+
+parser.add_argument('--report', type=float, default=10.0,
+          help='Interval in seconds for printing the summary. (default: 10.0)')
+
+parser.add_argument('--table', type=bool, default=False,
+          help='if True print the vessel table with each summary. (default: False)')
+
+parser.add_argument('--quiet', type=bool, default=False,
+                    help='if True suppress local printing. (default: False)')
+
+TTL = 20
+
+
+def mcastSocket(groups, port, iface, rcvbuf):
+   # see ais-fake-rx-udp.py for notes on binding multicast sockets
+   sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+   sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+   sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+   sock.bind((groups[0] if len(groups) == 1 else '', port))
+   for group in groups:
+       sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+        struct.pack( '4s4s', socket.inet_aton(group), socket.inet_aton(iface)))
+   sock.setblocking(False)
+   return(sock)
+
+
+def udpSocket(port, rcvbuf):
+   sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+   sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+   sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+   sock.bind(('', port))
+   sock.setblocking(False)
+   return(sock)
+
+
+def kernelDrops(socks):
+   '''
+   Sum of datagrams dropped by the kernel for the UDP sockets in socks, from
+   /proc/net/udp (last column). Returns None if that is not available.
+   '''
+   inodes = set(str(os.fstat(s.fileno()).st_ino) for s in socks)
+   try:
+      with open('/proc/net/udp', 'r') as f:  lines = f.readlines()[1:]
+   except OSError:
+      return(None)
+   n = 0
+   for ln in lines:
+       p = ln.split()
+       if p[9] in inodes : n += int(p[-1])
+   return(n)
+
+
+class TCPfeed(object):
+   '''
+   Line oriented TCP client for a real AIS receiver. Reconnects when the
+   connection is lost, waiting retry seconds between attempts.
+   The connect is non-blocking, so an unreachable receiver does not stop the
+   UDP sockets being drained: connect() returns the socket to be selected for
+   writing, and connected() is called when it is writable. A connect that has
+   not finished after retry seconds is abandoned (see timedOut()).
+   '''
+   def __init__(self, address, retry=5.0):
+      host, port = address.rsplit(':', 1)
+      self.address = (host, int(port))
+      self.retry   = retry
+      self.sock    = None
+      self.buf     = b''
+      self.next_try = 0.0
+      self.connecting = False
+
+   def connect(self, now):
+      if self.sock is not None or now < self.next_try : return(None)
+      self.next_try = now + self.retry
+      s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+      s.setblocking(False)
+      try:
+         err = s.connect_ex(self.address)
+      except OSError as e:
+         s.close()
+         self._failed(e)
+         return(None)
+      if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK) :
+         s.close()
+         self._failed(os.strerror(err))
+         return(None)
+      self.sock = s
+      self.buf  = b''
+      self.connecting = True
+      return(s)
+
+   def connected(self):
+      '''
+      Check the result of the connect when the socket is writable. Return True if
+      connected, otherwise the caller should unregister the socket and close().
+      '''
+      err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+      if err != 0 :
+         self._failed(os.strerror(err))
+         return(False)
+      self.connecting = False
+      return(True)
+
+   def timedOut(self, now):
+      # True if the connect started at next_try - retry has not finished
+      if self.connecting and now >= self.next_try :
+         self._failed('timed out')
+         return(True)
+      return(False)
+
+   def close(self):
+      if self.sock is not None : self.sock.close()
+      self.sock = None
+      self.connecting = False
+
+   def _failed(self, e):
+      sys.stderr.write('AIS feed %s:%i not connected: %s\n' % (self.address + (e,)))
+
+   def read(self):
+      '''
+      Return complete lines (bytes) received, or None if the connection closed.
+      '''
+      try:
+         data = self.sock.recv(65536)
+      except BlockingIOError:
+         return(b'')
+      except OSError:
+         data = b''
+      if not data :
+         self.sock.close()
+         self.sock = None
+         return(None)
+      data = self.buf + data
+      i = data.rfind(b'\n') + 1
+      self.buf = data[i:]
+      return(data[:i])
+
+
+def main(argv=None):
+   args = parser.parse_args(argv)
+
+   iface  = args.iface or socket.gethostbyname(socket.gethostname())
+   groups = args.mcast_groups.split(',')
+   assert(args.out_group is None or args.out_group not in groups)
+
+   forward = None
+   if args.out_group is not None :
+      out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+      out.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, TTL)
+      dest = (args.out_group, args.out_port)
+      forward = lambda s: out.sendto(s.encode(), dest)
+
+   table  = VesselTable(max_age=args.max_age)
+   mmsis  = None if args.mmsis is None else [int(m) for m in args.mmsis.split(',')]
+   ingest = AISingest(table, forward=forward, mmsis=mmsis)
+
+   sel = selectors.DefaultSelector()
+   udp = [mcastSocket(groups, args.mcast_port, iface, args.rcvbuf)]
+   sel.register(udp[0], selectors.EVENT_READ, 'lora')
+   if args.feed_udp is not None :
+      udp.append(udpSocket(args.feed_udp, args.rcvbuf))
+      sel.register(udp[1], selectors.EVENT_READ, 'ais')
+   feed = None if args.feed_tcp is None else TCPfeed(args.feed_tcp)
+
+   if not args.quiet :
+      print('listening on %s port %i' % (args.mcast_groups, args.mcast_port))
+      rb = udp[0].getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+      if rb < args.rcvbuf : print('receive buffer limited to %i bytes.' % rb)
+
+   buf  = bytearray(65536)
+   view = memoryview(buf)
+   drops0 = kernelDrops(udp)
+   t0 = last = monotonic()
+   n0 = 0
+
+   try:
+      while True:
+         now = monotonic()
+         if feed is not None :
+            if feed.timedOut(now) :
+               sel.unregister(feed.sock)
+               feed.close()
+            s = feed.connect(now)
+            if s is not None : sel.register(s, selectors.EVENT_WRITE, feed)
+
+         for key, mask in sel.select(timeout=min(1.0, args.report)):
+             now = monotonic()
+             if key.data is feed and feed.connecting :
+                if feed.connected() :
+                   sel.modify(key.fileobj, selectors.EVENT_READ, feed)
+                else :
+                   sel.unregister(key.fileobj)
+                   feed.close()
+                continue
+             if key.data is feed :
+                data = feed.read()
+                if data is None :
+                   sel.unregister(key.fileobj)
+                elif data :
+                   ingest.datagram(data, source='ais', now=now)
+                continue
+             # drain the socket, up to batch datagrams
+             sock = key.fileobj
+             for i in range(args.batch):
+                 try:
+                    n = sock.recv_into(buf)
+                 except BlockingIOError:
+                    break
+                 ingest.datagram(bytes(view[:n]), source=key.data, now=now)
+
+         now = monotonic()
+         if now - last >= args.report :
+            table.evict(now)
+            ingest.prune(now)
+            if not args.quiet :
+               st = ingest.stats
+               drops = kernelDrops(udp)
+               drops = 'NA' if drops is None else str(drops - drops0)
+               print('%s vessels %i  sentences %i (%.0f/s)  decoded %i  duplicates %i' \
+                     '  rejected %i  other %i  evicted %i  kernel drops %s' %
+                  (strftime('%H:%M:%S'), len(table), st['sentences'],
+                   (st['sentences'] - n0) / (now - last), st['decoded'],
+                   st['duplicates'],
+                   st['checksum'] + st['malformed'] + st['no_position'],
+                   st['other_types'] + st['fragments'] + st['filtered'],
+                   table.evicted, drops))
+               if args.table :
+                  for ln in table.lines(now) : print('   ' + ln)
+               sys.stdout.flush()
+            n0   = ingest.stats['sentences']
+            last = now
+   except KeyboardInterrupt:
+      print("Interrupt. ")
+   finally:
+      for s in udp : s.close()
+      if feed is not None : feed.close()
+      if forward is not None : out.close()
+      print('%i sentences in %.1f s. %r' % (ingest.stats['sentences'], monotonic() - t0,
+                                            ingest.stats))
+      print("Shut down.\n")
+
+
+if __name__ == '__main__':
+   main()
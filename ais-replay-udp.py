@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+'''
+Replay recorded tracks as pseudo AIS on a UDP multicast group, for load testing
+OpenCPN, ais-ingest-udp.py and other consumers without boats on the water.
+
+The records of all track files (in TRACKS_* directories as written by LoRaGPS_base,
+or individual files) are merged in time order and sent with AIS1_encode, like
+LoRaGPS_base does. MMSIs come from HOSTNAME_MMSIs.json in the current directory,
+hosts that are not listed there get local MMSIs as with LoRaGPS_base --unknown=mmsi.
+
+  python3  ./ais-replay-udp.py TRACKS_2020-05-20_19:00:00          # real time
+  python3  ./ais-replay-udp.py --speed=100 TRACKS_*                 # 100 times real time
+  python3  ./ais-replay-udp.py --max_rate=True --loop=True --clones=50 TRACKS_*
+
+--max_rate ignores the time stamps and sends as fast as possible, reporting the
+achieved sentences per second. --clones=N sends each track N times as different
+boats (with local MMSIs and positions shifted north by --clone_offset degrees)
+to simulate a larger fleet. --jitter adds a random delay of up to that many
+seconds (of wall clock time) to each report.
+'''
+
+import argparse
+import random
+import socket
+import sys
+from time import sleep, monotonic
+
+from AIS import AIS1_encode
+from nodes import NodeRegistry
+from tracks import trackFiles, mergeTracks
+
+parser = argparse.ArgumentParser(description=
+           'Replay recorded tracks as pseudo AIS on UDP multicast.')
+
+parser.add_argument('tracks', nargs='+',
+          help='TRACKS_* directories or track files.')
+
+parser.add_argument('--mcast_group', type=str, default='224.1.1.4',
+          help='Network multicast group for AIS output (default: "224.1.1.4")')
+
+parser.add_argument('--mcast_port', type=int, default=65433,
+          help='Network multicast port. (default: 65433)')
+
+parser.add_argument('--speed', type=float, default=1.0,
+          help='Replay speed factor, e.g. 10 or 100. (default: 1.0, real time)')
+
+parser.add_argument('--max_rate', type=bool, default=False,
+          help='if True send as fast as possible, ignoring time stamps. (default: False)')
+
+parser.add_argument('--loop', type=bool, default=False,
+          help='if True repeat the tracks until interrupted. (default: False)')
+
+parser.add_argument('--jitter', type=float, default=0.0,
+          help='Maximum random delay added to each report, in seconds. (default: 0.0)')
+
+parser.add_argument('--clones', type=int, default=1,
+          help='Number of boats sent for each track. (default: 1)')
+
+parser.add_argument('--clone_offset', type=float, default=0.0005,
+          help='Latitude offset in degrees between clones. (default: 0.0005)')
+
+parser.add_argument('--batch', type=int, default=1,
+          help='Maximum sentences per datagram (separated by "\\r\\n"). (default: 1)')
+
+parser.add_argument('--report', type=float, default=5.0,
+          help='Interval in seconds for printing the rate. (default: 5.0)')
+
+parser.add_argument('--quiet', type=bool, default=False,
+                    help='if True suppress local printing. (default: False)')
+
+TTL = 20
+
+
+def replay(fls, loop=False, clones=1, clone_offset=0.0):
+   '''
+   Generator of (t, hostname, lat, lon, sec) in time order. With loop the tracks
+   are repeated with t continuing from the end of the previous pass. Clones have
+   hostnames 'hostname~k'.
+   '''
+   offset = 0.0
+   while True:
+      first = last = None
+      for t, bt, lat, lon, sec in mergeTracks(fls):
+          if first is None : first = t
+          last = t
+          yield((t + offset, bt, lat, lon, sec))
+          for k in range(1, clones):
+              yield((t + offset, '%s~%i' % (bt, k), lat + k * clone_offset, lon, sec))
+      if not loop or first is None : return
+      offset += last - first + 1.0
+
+
+def main(argv=None):
+   args = parser.parse_args(argv)
+   assert(args.speed > 0)
+   assert(args.clones >= 1 and args.batch >= 1)
+
+   fls = trackFiles(args.tracks)
+   if not fls :
+      raise RuntimeError('no track files in ' + str(args.tracks))
+
+   registry = NodeRegistry(id_file=None, unknown='mmsi', confirm=1, quiet=True)
+
+   sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+   sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, TTL)
+   dest = (args.mcast_group, args.mcast_port)
+
+   if not args.quiet :
+      print('replaying %i track files to %s:%i' % (len(fls), args.mcast_group, args.mcast_port))
+
+   batch = []
+   sent = datagrams = n0 = 0
+   t0 = last = monotonic()
+   first = None
+
+   try:
+      for t, bt, lat, lon, sec in replay(fls, loop=args.loop, clones=args.clones,
+                                         clone_offset=args.clone_offset):
+          if not args.max_rate :
+             if first is None : first = t
+             due = t0 + (t - first) / args.speed
+             if args.jitter > 0 : due += random.uniform(0.0, args.jitter)
+             wait = due - monotonic()
+             if wait > 0 :
+                # send what is waiting before sleeping
+                if batch :
+                   sock.sendto('\r\n'.join(batch).encode(), dest)
+                   datagrams += 1
+                   batch = []
+                sleep(wait)
+
+          ais = AIS1_encode(
+             mmsi=registry.lookup(bt).mmsi, navStat=0, ROT=128, SOG=1023, PosAcc=0,
+             lon= lon, lat= lat, COG=360, HDG=511, tm=int(sec), mvInd=0,
+             spare=0, RAIM=False, RadStat=0, returnk=False)
+          batch.append(ais)
+          sent += 1
+          if len(batch) >= args.batch :
+             sock.sendto('\r\n'.join(batch).encode(), dest)
+             datagrams += 1
+             batch = []
+
+          if not args.quiet and sent % 256 == 0 :
+             now = monotonic()
+             if now - last >= args.report :
+                print('sent %i sentences (%.0f/s)' % (sent, (sent - n0) / (now - last)))
+                sys.stdout.flush()
+                n0   = sent
+                last = now
+
+      if batch :
+         sock.sendto('\r\n'.join(batch).encode(), dest)
+         datagrams += 1
+   except KeyboardInterrupt:
+      print("Interrupt. ")
+   finally:
+      sock.close()
+      dt = monotonic() - t0
+      print('%i sentences in %i datagrams in %.1f s, %.0f sentences/s' %
+            (sent, datagrams, dt, sent / dt if dt > 0 else 0.0))
+
+
+if __name__ == '__main__':
+   main()
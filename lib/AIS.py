@@ -25,6 +25,11 @@ AISpayload1_encode(mmsi=123456789, lat=49.40, lon=-72.0, tm=60)
 
 AIS1_encode(mmsi=123456789, lat=49.40, lon=-72.0, tm=60)
 
+# when only a few fields are needed, or only some vessels
+AISpayload_peek("13HOI:0P0000VOHLCnHQKwvL05Ip")    # (1, 227006760)  type and MMSI
+r = AIS1record("13HOI:0P0000VOHLCnHQKwvL05Ip")     # fields decoded when used
+r.mmsi, r.lat, r.lon,  r[2], r[8], r[7]
+
 In particular, regarding true AIS, this code does not address the standard for
 radio transmission, and much gets done and undone by the AIS radio link layer at 
 transmission time. Thus this code does not deal with any of the consideration in
@@ -32,6 +37,8 @@ https://gpsd.gitlab.io/gpsd/AIVDM.html#_ais_payload_byte_alignment_padding_and_b
 which start saying "Warning: Here there be dragons."
 '''
 
+from binascii import a2b_base64
+
 
 
 ######## notes #############################
@@ -46,6 +53,36 @@ which start saying "Warning: Here there be dragons."
 
 ###############################################
 
+# Payload armoring: each payload character is 6 bits. _BITS is a str.translate
+# table from payload character to its 6 bit string, so a payload is converted to a
+# bit string in one call. Characters not in _ARMOR are left unchanged.
+
+_ARMOR = "0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVW" + "`abcdefghijklmnopqrstuvw"
+_BITS  = str.maketrans(dict((ch, '{:06b}'.format(i)) for i, ch in enumerate(_ARMOR)))
+
+# The armoring uses the same 6 bit values as base64 with a different alphabet, so
+# AIS1record and AISpayload_peek convert a payload to bytes with a bytes.translate to base64 characters
+# and a2b_base64. Characters not in _ARMOR become '!', which a2b_base64 drops, so
+# they show up as a short result.
+
+_B64 = bytearray(b'!' * 256)
+for _i, _ch in enumerate(_ARMOR):
+   _B64[ord(_ch)] = ord("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"[_i])
+_B64 = bytes(_B64)
+
+NAVSTAT = (
+   "Under way using engine", "At anchor", "Not under command", "Restricted manoeuverability",
+   "Constrained by her draught", "Moored", "Aground", "Engaged in Fishing", 
+   "Under way sailing",	 "Reserved for future amendment of Navigational Status for HSC", 
+   "Reserved for future amendment of Navigational Status for WIG", 
+   "Reserved for future use", "Reserved for future use", "Reserved for future use", 
+   "AIS-SART is active", "Not defined (default)" )
+
+MVIND = (
+   "Not available (default)", "No special maneuver", 
+   "Special maneuver (such as regional passing arrangement)" )
+
+
 def AIS1_encode(mmsi=123456789, navStat=8, ROT=128, SOG=1023, PosAcc=False, 
       lon=181.0, lat=91, COG=360, HDG=511, tm=60, mvInd=0,  
       spare=0, RAIM=False, RadStat=0, returnk=False):
@@ -209,18 +246,14 @@ def AISpayload1_decode(payload, description=True, onlyValid=True, returnk=False)
    if not 0 < len(payload) :
       raise ValueError("Payload checksum failure.")
    
-   # Do not think of x1 and x2 characters as meaning much other than the 6-bit ascii display
+   # Do not think of the _ARMOR characters as meaning much other than the 6-bit ascii display
    # of an encoded message. They are convenient to build the decoding used for constructing 
    # the bit string k which is parsed to get the message.
    
-   x1 = "0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVW"
-   x2 = "`abcdefghijklmnopqrstuvw"
+   k = payload.translate(_BITS)
    
-   y  = [ord(ch)-48 for ch in x1] + [ord(ch)-56 for ch in x2] 
-   
-   z = ['{:006b}'.format(i) for i in y]
-   
-   k = ''.join([z[(x1 + x2).index(i)] for i in payload])
+   if len(k) != 6 * len(payload) :
+      raise ValueError("Payload has characters that are not 6-bit armored.")
    
    # IT IS POSSIBLE ROT NEEDS TO BE SQUARED AND SCALED
    #ROT is 8 bit 2's compliment, first bit is the sign.
@@ -237,7 +270,7 @@ def AISpayload1_decode(payload, description=True, onlyValid=True, returnk=False)
          return(128)
       elif m[0]=='1' :
          # 2s complement in string
-         return(-int(m[1:].replace('1','x').replace('0','1').replace('x','0'), 2) +1)
+         return(int(m, 2) - (1 << len(m)))
       else :
          return( int(m[1:],  2) )
    
@@ -267,21 +300,8 @@ def AISpayload1_decode(payload, description=True, onlyValid=True, returnk=False)
    if cnb[9] == 360.0:  cnb[9] = 3600  # 3600 means NA
    
    if description:
-      navStat = (
-   	 "Under way using engine", "At anchor", "Not under command", "Restricted manoeuverability",
-   	 "Constrained by her draught", "Moored", "Aground", "Engaged in Fishing", 
-   	 "Under way sailing",	 "Reserved for future amendment of Navigational Status for HSC", 
-   	 "Reserved for future amendment of Navigational Status for WIG", 
-   	 "Reserved for future use", "Reserved for future use", "Reserved for future use", 
-   	 "AIS-SART is active", "Not defined (default)" )
-      
-      
-      mvInd = (
-   	 "Not available (default)", "No special maneuver", 
-   	 "Special maneuver (such as regional passing arrangement)" )
-   
-      cnb[3]  = navStat[cnb[3]]
-      cnb[12] = mvInd[cnb[12]]
+      cnb[3]  = NAVSTAT[cnb[3]]
+      cnb[12] = MVIND[cnb[12]]
    
    if returnk:
       return(k)
@@ -293,6 +313,130 @@ def AISpayload1_decode(payload, description=True, onlyValid=True, returnk=False)
 
 
 
+def AISpayload_peek(payload):
+   '''
+   Return (message type, MMSI) from the first 8 characters of a payload, without
+   decoding the rest. This is a cheap filter to use before AIS1record or
+   AISpayload1_decode. It works for all message types (the MMSI is in bits 8-37).
+   ValueError is raised if the payload is too short or not 6-bit armored.
+   '''
+   b = a2b_base64(payload[:8].encode('ascii').translate(_B64))
+   if len(b) != 6 :
+      raise ValueError("Payload too short or not 6-bit armored.")
+   v = int.from_bytes(b, 'big')
+   return((v >> 42, (v >> 10) & 0x3FFFFFFF))
+
+
+
+class AIS1record(object):
+   '''
+   Lazily decoded position report (message type 1, 2 or 3).
+   
+   The first 168 bits of the payload are converted to an integer when the record
+   is created, and each field is a property that shifts and masks that integer
+   when it is used, so the cost is in the fields that are used. Fields can be used
+   by name (the argument names of AIS1_encode, plus msgType, repeat) or by index as
+   in the list returned by AISpayload1_decode (cnb), so a record can be passed to
+   cnbValid and cnbCompare. Values are the same as from AISpayload1_decode.
+   
+   If description=True navStat and mvInd are descriptive values (as with
+   AISpayload1_decode). The default here is False.
+   onlyValid=True runs cnbValid when the record is created.
+   See  python3 lib/AIS.py bench  for a timing comparison with AISpayload1_decode.
+   '''
+   
+   # name, start bit, length in bits, in the order of cnb in AISpayload1_decode
+   FIELDS = (
+      ('msgType',   0,  6),   #0  Message Type
+      ('repeat',    6,  2),   #1  Repeat Indicator
+      ('mmsi',      8, 30),   #2  MMSI
+      ('navStat',  38,  4),   #3  Navigation Status
+      ('ROT',      42,  8),   #4  Rate of Turn (ROT) AIS
+      ('SOG',      50, 10),   #5  Speed Over Ground (SOG)
+      ('PosAcc',   60,  1),   #6  Position Accuracy
+      ('lon',      61, 28),   #7  Longitude
+      ('lat',      89, 27),   #8  Latitude
+      ('COG',     116, 12),   #9  Course Over Ground (COG) Relative to true north
+      ('HDG',     128,  9),   #10 True Heading (HDG)
+      ('tm',      137,  6),   #11 Time Stamp
+      ('mvInd',   143,  2),   #12 Maneuver Indicator
+      ('spare',   145,  3),   #13 Spare
+      ('RAIM',    148,  1),   #14 RAIM flag
+      ('RadStat', 149, 19),   #15 Radio status
+      )
+   
+   __slots__ = ('_v', '_description')
+   
+   def __init__(self, payload, description=False, onlyValid=False):
+      b = a2b_base64(payload[:28].encode('ascii').translate(_B64))
+      if len(b) != 21 :
+         raise ValueError("Payload too short or not 6-bit armored.")
+      self._v = int.from_bytes(b, 'big')
+      self._description = description
+      if onlyValid :
+         cnbValid(self)
+   
+   def __getitem__(self, i):
+      if isinstance(i, slice) :
+         return([self[j] for j in range(*i.indices(16))])
+      return(getattr(self, self.FIELDS[i][0]))
+   
+   def __len__(self):
+      return(16)
+   
+   def __iter__(self):
+      for f in self.FIELDS:
+         yield(getattr(self, f[0]))
+   
+   def __eq__(self, other):
+      try:
+         return(len(other) == 16 and all(x == y for x, y in zip(self, other)))
+      except TypeError:
+         return(NotImplemented)
+   
+   __hash__ = None
+   
+   def __repr__(self):
+      return('AIS1record(' + ', '.join('%s=%r' % (f[0], getattr(self, f[0]))
+                                       for f in self.FIELDS) + ')')
+
+
+def _signed(n, scale=None):
+   # 2s complement in n bits, then divided by scale
+   top, full = 1 << (n - 1), 1 << n
+   if scale is None :
+      # ROT '10000000' means NA and is 128
+      return(lambda u: u - full if u > top else u)
+   return(lambda u: (u - full if u & top else u) / scale)
+
+# converters from the unsigned field value, by field index
+_CONVERT = {
+   4:  _signed(8),
+   5:  lambda u: u / 10 if u < 1022 else u,     # 1022 means > 102.0 knots, 1023 means NA
+   6:  bool,
+   7:  _signed(28, 600000),
+   8:  _signed(27, 600000),
+   9:  lambda u: u / 10 if u != 3600 else u,     # 3600 means NA
+   13: '{:03b}'.format,
+   14: bool,
+   }
+
+def _recordField(i, start, n):
+   shift, mask = 168 - start - n, (1 << n) - 1
+   conv = _CONVERT.get(i)
+   if i in (3, 12) :
+      desc = NAVSTAT if i == 3 else MVIND
+      return(property(lambda self: desc[(self._v >> shift) & mask] if self._description
+                                   else (self._v >> shift) & mask))
+   if conv is None :
+      return(property(lambda self: (self._v >> shift) & mask))
+   return(property(lambda self: conv((self._v >> shift) & mask)))
+
+for _i, (_name, _start, _n) in enumerate(AIS1record.FIELDS):
+   setattr(AIS1record, _name, _recordField(_i, _start, _n))
+
+
+
 def cnbValid(x):
    # This check is for local use (eg what is/might be implemented)
    # Lots of these are are more restrictive than the standard
@@ -407,6 +551,30 @@ def cnbCompare(x, y, fuzz=1e-7):
    
    return(ok)
 
+###########################################################################
+########################### benchmark #####################################
+###########################################################################
+
+def bench(n=100000):
+   '''
+   Time in us per payload of AISpayload1_decode (description=False, onlyValid=False)
+   and of AIS1record with the fields used by lib/vessels.py.
+   '''
+   from timeit import repeat
+   p = "14eGrSPP00ncMJTO5C6aBwvP2D0?"
+   g = {'p': p, 'AISpayload1_decode': AISpayload1_decode, 'AIS1record': AIS1record,
+        'AISpayload_peek': AISpayload_peek}
+   for name, stmt in (
+      ('AISpayload_peek',               "AISpayload_peek(p)"),
+      ('AISpayload1_decode',            "AISpayload1_decode(p, description=False, onlyValid=False)"),
+      ('AIS1record',                    "AIS1record(p)"),
+      ('AIS1record mmsi lat lon',       "r = AIS1record(p); r.mmsi; r.lat; r.lon"),
+      ('AIS1record lat lon SOG COG HDG', "r = AIS1record(p); r.lat; r.lon; r.SOG; r.COG; r.HDG"),
+      ('AIS1record all fields',         "list(AIS1record(p))")):
+       t = min(repeat(stmt, globals=g, number=n, repeat=5)) / n * 1e6
+       print('%-32s %6.2f us' % (name, t))
+
+
 ###########################################################################
 ####################### unittest  tests  ##################################
 ###########################################################################
@@ -417,252 +585,310 @@ def cnbCompare(x, y, fuzz=1e-7):
 #  Note that E/W and N/S at that site are indicated in the LIST OF MESSAGE TYPE 1,2,3
 #  at the bottom of the maritec report, and NOT with a +/- sign in the 'Position Report'
 
-import unittest
-
-
-class TestAIS(unittest.TestCase):
-
-    #self.assertEqual(x, y, message)
-    #self.assertTrue(x, message)
-    
-    def test_E_1(self):
-        # need to confirm this is a correct test
-        self.assertEqual(
-           AISpayload1_encode(mmsi=123456789, lon=-72.0, lat=49.40, tm=60), 
-           '11mg=5HP?wJnJ@0LA5@>4?wp0000', 
-           "encoding test E_1 failed.")
-
-    def test_E_D_1(self):
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode( AISpayload1_encode(
-                 mmsi=123456789, lon=-72.0, lat=49.40, tm=60), description=False),
-     [1, 0, 123456789, 8, 128, 1023, False, -72.0, 49.4, 3600, 511, 60, 0, '000', False, 0],  
-              fuzz=1e-5),  "encode and decoding test E_D_1 failed.")
-
-    
-    #     !AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23
-
-    def test_D_1(self):    
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode("13HOI:0P0000VOHLCnHQKwvL05Ip" , description=False),
-      ( 1, 0, 227006760, 0, -128.0, 0.0, 0, 0.1313800, 49.4755767, 36.7, 511, 14, 0, 0, 0 )),
-            "decoding test D_1 failed.")
- 
-    def test_D_2(self):    
-        self.assertTrue(
-           cnbCompare(
-              AIS1_decode("!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23" , description=False),
-      ( 1, 0, 227006760, 0, -128.0, 0.0, 0, 0.1313800, 49.4755767, 36.7, 511, 14, 0, 0, 0 )),
-            "decoding test D_2 failed.")
-
-
-    #       !AIVDM,1,1,,A,133sVfPP00PD>hRMDH@jNOvN20S8,0*7F
-
-    def test_D_3(self):    
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode("133sVfPP00PD>hRMDH@jNOvN20S8" , description=False),
-       ( 1, 0, 205448890, 0, -128.0, 0.0, 1, 4.4194417, 51.2376583, 63.3, 511, 15, 0, 0, 1 )),
-            "decoding test D_3 failed.")
-
-    def test_D_4(self):    
-        self.assertTrue(
-           cnbCompare(
-              AIS1_decode("!AIVDM,1,1,,A,133sVfPP00PD>hRMDH@jNOvN20S8,0*7F" , description=False),
-       ( 1, 0, 205448890, 0, -128.0, 0.0, 1, 4.4194417, 51.2376583, 63.3, 511, 15, 0, 0, 1 )),
-            "decoding test D_4 failed.")
-
-
-    #       !AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B
-
-    # next should all give same (payload) result
-
-    def test_E_2(self):
-        self.assertEqual(
-           '133sVfPP00SbS242Qn4@?wvN2000',
-           AISpayload1_encode(
-              205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
-           "encoding test E_2 failed.")
-    # 51.2376583 vs 51.2376567 on test site
-
-    def test_E_3(self):
-        self.assertEqual(
-           '133sVfPP00SbS242Qn4@?wvN2000',
-           AISpayload1_encode(
-              mmsi=205448890, navStat=0, ROT=-128, SOG=0.0, PosAcc=1, 
-              lon=51.2376583, lat=4.4194417, COG=6.3, HDG=511, tm=15, mvInd=0,  
-              spare=0, RAIM=True, RadStat=0, returnk=False),
-           "encoding test E_3 failed.")
-
-    def test_E_4(self):
-        self.assertEqual(
-           '!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B',
-           AIS1_encode(
-              205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
-           "encoding test E_4 failed.")
-
-
-    def test_E_5(self):
-        self.assertEqual(
-           '!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B',
-           AIS1_encode(
-              mmsi=205448890, navStat=0, ROT=-128, SOG=0.0, PosAcc=1, 
-              lon=51.2376583, lat=4.4194417, COG=6.3, HDG=511, tm=15, mvInd=0,  
-              spare=0, RAIM=True, RadStat=0, returnk=False),
-           "encoding test E_5 failed.")
-
-    def test_E_6(self):
-        self.assertEqual(
-           '!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B',
-           AIS1_encode(
-              205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
-           "encoding test E_6 failed.")
-
-    def test_D_5(self):    
-        self.assertTrue(
-           cnbCompare(
-              AIS1_decode('!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B' , description=False), 
-   [1, 0, 205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ] ,
-              fuzz=1e-5 ),  #reduced tolerance for longitude comparison
-              "decoding test D_5 failed.")
-
-
-    #       !AIVDM,1,1,,B,100h00PP0@PHFV`Mg5gTH?vNPUIp,0*3B
-
-    def test_D_6(self):    
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode(
-                 "100h00PP0@PHFV`Mg5gTH?vNPUIp" , description=False),
-      ( 1, 0, 786434, 0, -128.0, 1.6, 1, 5.3200333, 51.9670367, 112.0, 511, 15, 1, 0, 0 )),
-              "decoding test D_6 failed.")
-
-    def test_D_7(self):    
-        self.assertTrue(
-           cnbCompare(
-              AIS1_decode(
-                 "!AIVDM,1,1,,B,100h00PP0@PHFV`Mg5gTH?vNPUIp,0*3B" , description=False),
-      ( 1, 0, 786434, 0, -128.0, 1.6, 1, 5.3200333, 51.9670367, 112.0, 511, 15, 1, 0, 0 )),
-              "decoding test D_7 failed.")
-
-    #       !AIVDM,1,1,,B,13eaJF0P00Qd388Eew6aagvH85Ip,0*45
-
-    def test_D_8(self):    
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode(
-                 "13eaJF0P00Qd388Eew6aagvH85Ip" , description=False),
-      ( 1, 0, 249191000, 0, -128.0, 0.0, 1, 23.6036333, 37.9558833, 247.0, 511, 12, 0, 2, 0 )),
-              "decoding test D_8 failed.")
-
-    def test_D_9(self):    
-        self.assertTrue(
-           cnbCompare(
-              AIS1_decode(
-                 "!AIVDM,1,1,,B,13eaJF0P00Qd388Eew6aagvH85Ip,0*45" , description=False),
-      ( 1, 0, 249191000, 0, -128.0, 0.0, 1, 23.6036333, 37.9558833, 247.0, 511, 12, 0, 2, 0 )),
-              "decoding test D_9 failed.")
-
-    # AISpayload1_decode("13eaJF0P00Qd388Eew6aagvH85Ip" , returnk=True)[61:89]
-    # x='0000110110000001100100000100'   
-
-
-
-    #       !AIVDM,1,1,,A,14eGrSPP00ncMJTO5C6aBwvP2D0?,0*7A
-
-    def test_E_7(self):
-        self.assertEqual(
-           '!AIVDM,1,1,,A,14eGrSPP00ncMJTO5C6aBwvP2D0?,0*7A',
-           AIS1_encode(
-              mmsi=316013198, navStat=0, ROT=-128, SOG=0.0, PosAcc=1, 
-              lon= -130.3162367, lat= 54.3211100, COG=237.9, HDG=511, tm=16, mvInd=0,  
-              spare=0, RAIM=True, RadStat=81935, returnk=False),
-           "encoding test E_7 failed.")
-
-    # radio status not reported at maritec but the value needed for the same checksum above is
-    #int(AISpayload1_decode("14eGrSPP00ncMJTO5C6aBwvP2D0?" , returnk=True)[149:] , 2)  # 81935
-
-    
-    def test_D_10(self):    
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode(
-                 "14eGrSPP00ncMJTO5C6aBwvP2D0?" , description=False),
-  (1,0, 316013198, 0, -128.0, 0.0, 1, -130.3162367, 54.3211100, 237.9, 511, 16, 0, 0, 1, 81935),
-              fuzz=1e-5 ),  #reduced tolerance for longitude comparison
-              "decoding test D_10 failed.")
-
+if __name__ == '__main__':
+   # tests are only defined when run as a program, to keep imports fast
+
+   import unittest
+
+
+   class TestAIS(unittest.TestCase):
+
+       #self.assertEqual(x, y, message)
+       #self.assertTrue(x, message)
+
+       def test_E_1(self):
+           # need to confirm this is a correct test
+           self.assertEqual(
+              AISpayload1_encode(mmsi=123456789, lon=-72.0, lat=49.40, tm=60), 
+              '11mg=5HP?wJnJ@0LA5@>4?wp0000', 
+              "encoding test E_1 failed.")
+
+       def test_E_D_1(self):
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode( AISpayload1_encode(
+                    mmsi=123456789, lon=-72.0, lat=49.40, tm=60), description=False),
+        [1, 0, 123456789, 8, 128, 1023, False, -72.0, 49.4, 3600, 511, 60, 0, '000', False, 0],  
+                 fuzz=1e-5),  "encode and decoding test E_D_1 failed.")
+
+
+       #     !AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23
+
+       def test_D_1(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode("13HOI:0P0000VOHLCnHQKwvL05Ip" , description=False),
+         ( 1, 0, 227006760, 0, -128.0, 0.0, 0, 0.1313800, 49.4755767, 36.7, 511, 14, 0, 0, 0 )),
+               "decoding test D_1 failed.")
+
+       def test_D_2(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AIS1_decode("!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23" , description=False),
+         ( 1, 0, 227006760, 0, -128.0, 0.0, 0, 0.1313800, 49.4755767, 36.7, 511, 14, 0, 0, 0 )),
+               "decoding test D_2 failed.")
+
+
+       #       !AIVDM,1,1,,A,133sVfPP00PD>hRMDH@jNOvN20S8,0*7F
+
+       def test_D_3(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode("133sVfPP00PD>hRMDH@jNOvN20S8" , description=False),
+          ( 1, 0, 205448890, 0, -128.0, 0.0, 1, 4.4194417, 51.2376583, 63.3, 511, 15, 0, 0, 1 )),
+               "decoding test D_3 failed.")
+
+       def test_D_4(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AIS1_decode("!AIVDM,1,1,,A,133sVfPP00PD>hRMDH@jNOvN20S8,0*7F" , description=False),
+          ( 1, 0, 205448890, 0, -128.0, 0.0, 1, 4.4194417, 51.2376583, 63.3, 511, 15, 0, 0, 1 )),
+               "decoding test D_4 failed.")
+
+
+       #       !AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B
+
+       # next should all give same (payload) result
+
+       def test_E_2(self):
+           self.assertEqual(
+              '133sVfPP00SbS242Qn4@?wvN2000',
+              AISpayload1_encode(
+                 205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
+              "encoding test E_2 failed.")
+       # 51.2376583 vs 51.2376567 on test site
+
+       def test_E_3(self):
+           self.assertEqual(
+              '133sVfPP00SbS242Qn4@?wvN2000',
+              AISpayload1_encode(
+                 mmsi=205448890, navStat=0, ROT=-128, SOG=0.0, PosAcc=1, 
+                 lon=51.2376583, lat=4.4194417, COG=6.3, HDG=511, tm=15, mvInd=0,  
+                 spare=0, RAIM=True, RadStat=0, returnk=False),
+              "encoding test E_3 failed.")
+
+       def test_E_4(self):
+           self.assertEqual(
+              '!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B',
+              AIS1_encode(
+                 205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
+              "encoding test E_4 failed.")
+
+
+       def test_E_5(self):
+           self.assertEqual(
+              '!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B',
+              AIS1_encode(
+                 mmsi=205448890, navStat=0, ROT=-128, SOG=0.0, PosAcc=1, 
+                 lon=51.2376583, lat=4.4194417, COG=6.3, HDG=511, tm=15, mvInd=0,  
+                 spare=0, RAIM=True, RadStat=0, returnk=False),
+              "encoding test E_5 failed.")
+
+       def test_E_6(self):
+           self.assertEqual(
+              '!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B',
+              AIS1_encode(
+                 205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
+              "encoding test E_6 failed.")
+
+       def test_D_5(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AIS1_decode('!AIVDM,1,1,,A,133sVfPP00SbS242Qn4@?wvN2000,0*3B' , description=False), 
+      [1, 0, 205448890, 0, -128, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ] ,
+                 fuzz=1e-5 ),  #reduced tolerance for longitude comparison
+                 "decoding test D_5 failed.")
+
+
+       #       !AIVDM,1,1,,B,100h00PP0@PHFV`Mg5gTH?vNPUIp,0*3B
+
+       def test_D_6(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode(
+                    "100h00PP0@PHFV`Mg5gTH?vNPUIp" , description=False),
+         ( 1, 0, 786434, 0, -128.0, 1.6, 1, 5.3200333, 51.9670367, 112.0, 511, 15, 1, 0, 0 )),
+                 "decoding test D_6 failed.")
+
+       def test_D_7(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AIS1_decode(
+                    "!AIVDM,1,1,,B,100h00PP0@PHFV`Mg5gTH?vNPUIp,0*3B" , description=False),
+         ( 1, 0, 786434, 0, -128.0, 1.6, 1, 5.3200333, 51.9670367, 112.0, 511, 15, 1, 0, 0 )),
+                 "decoding test D_7 failed.")
+
+       #       !AIVDM,1,1,,B,13eaJF0P00Qd388Eew6aagvH85Ip,0*45
+
+       def test_D_8(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode(
+                    "13eaJF0P00Qd388Eew6aagvH85Ip" , description=False),
+         ( 1, 0, 249191000, 0, -128.0, 0.0, 1, 23.6036333, 37.9558833, 247.0, 511, 12, 0, 2, 0 )),
+                 "decoding test D_8 failed.")
+
+       def test_D_9(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AIS1_decode(
+                    "!AIVDM,1,1,,B,13eaJF0P00Qd388Eew6aagvH85Ip,0*45" , description=False),
+         ( 1, 0, 249191000, 0, -128.0, 0.0, 1, 23.6036333, 37.9558833, 247.0, 511, 12, 0, 2, 0 )),
+                 "decoding test D_9 failed.")
+
+       # AISpayload1_decode("13eaJF0P00Qd388Eew6aagvH85Ip" , returnk=True)[61:89]
+       # x='0000110110000001100100000100'   
+
+
+
+       #       !AIVDM,1,1,,A,14eGrSPP00ncMJTO5C6aBwvP2D0?,0*7A
+
+       def test_E_7(self):
+           self.assertEqual(
+              '!AIVDM,1,1,,A,14eGrSPP00ncMJTO5C6aBwvP2D0?,0*7A',
+              AIS1_encode(
+                 mmsi=316013198, navStat=0, ROT=-128, SOG=0.0, PosAcc=1, 
+                 lon= -130.3162367, lat= 54.3211100, COG=237.9, HDG=511, tm=16, mvInd=0,  
+                 spare=0, RAIM=True, RadStat=81935, returnk=False),
+              "encoding test E_7 failed.")
+
+       # radio status not reported at maritec but the value needed for the same checksum above is
+       #int(AISpayload1_decode("14eGrSPP00ncMJTO5C6aBwvP2D0?" , returnk=True)[149:] , 2)  # 81935
+
+
+       def test_D_10(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode(
+                    "14eGrSPP00ncMJTO5C6aBwvP2D0?" , description=False),
+     (1,0, 316013198, 0, -128.0, 0.0, 1, -130.3162367, 54.3211100, 237.9, 511, 16, 0, 0, 1, 81935),
+                 fuzz=1e-5 ),  #reduced tolerance for longitude comparison
+                 "decoding test D_10 failed.")
+
+
+       #       test positive ROT 
+
+       def test_E_8(self):
+           self.assertEqual(
+              '!AIVDM,1,1,,A,133sVfP5@0SbS242Qn4@?wvN2000,0*2E',
+              AIS1_encode(
+                 205448890, 0, 20, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
+              "encoding test E_8 failed.")
+
+       #maritec shows +19.7 vs 20 ; 51.2376567 vs 51.2376583 
+       #OpenCPN says   20  deg/min right
+
+
+       def test_E_9(self):
+           self.assertEqual(
+              '!AIVDM,1,1,,A,133sVfh<@0P00002Qn4@?wvN2000,0*2B',
+              AIS1_encode(
+                 205448891, 0, 108, 0.0, 1, 0.000000, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
+              "encoding test E_9 failed.")
+
+       #maritec shows  +107.2 vs 108 
+       #OpenCPN says    107  deg/min right
+
 
-    #       test positive ROT 
+       #       test negative ROT
+
+       def test_E_6(self):
+           self.assertEqual(
+              '!AIVDM,1,1,,A,133sVg0rh0rAjP02Qn4@?wvN2000,0*7D',
+              AIS1_encode(
+                 205448892, 0, -20, 0.0, 1, -80.0000, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
+              "encoding test E_6 failed.")
 
-    def test_E_8(self):
-        self.assertEqual(
-           '!AIVDM,1,1,,A,133sVfP5@0SbS242Qn4@?wvN2000,0*2E',
-           AIS1_encode(
-              205448890, 0, 20, 0.0, 1, 51.2376583, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
-           "encoding test E_8 failed.")
+       #maritec shows  -19.7  vs  -20 
+       #OpenCPN says    20  deg/min left
 
-    #maritec shows +19.7 vs 20 ; 51.2376567 vs 51.2376583 
-    #OpenCPN says   20  deg/min right
+
+       def test_D_11(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode(
+                    "15MrVH0000KH<:V:NtBLoqFP2H9:" , description=False),
+     ( 1, 0, 366913120, 0, 0.0, 0.0, 0, -64.6206617, 18.3211883, 329.5, 299, 16, 0, 0, 1 ),
+                 fuzz = 1e-5), # fuzz increased for longitude comparison -64.62065833333334  vs  -64.6206617
+                 "decoding test D_11 failed.")
 
 
-    def test_E_9(self):
-        self.assertEqual(
-           '!AIVDM,1,1,,A,133sVfh<@0P00002Qn4@?wvN2000,0*2B',
-           AIS1_encode(
-              205448891, 0, 108, 0.0, 1, 0.000000, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
-           "encoding test E_9 failed.")
+       def test_D_12(self):    
+           self.assertTrue(
+              cnbCompare(
+                 AISpayload1_decode(
+                    "15N9NLPP01IS<RFF7fLVmgvN00Rv" , description=False),
+     ( 1, 0, 367156850, 0, -128.0, 0.1, 0, -90.1784350, 38.6587500, 175.0, 511, 15, 0, 0, 0 ),
+                     fuzz = 1e-5), # fuzz increased for lon comparison -90.17843166666667  vs  -90.178435
+                 "decoding test D_12 failed.")
 
-    #maritec shows  +107.2 vs 108 
-    #OpenCPN says    107  deg/min right
 
+       #       lazy record and peek
 
-    #       test negative ROT
+       payloads = ("13HOI:0P0000VOHLCnHQKwvL05Ip", "133sVfPP00PD>hRMDH@jNOvN20S8",
+                   "133sVfPP00SbS242Qn4@?wvN2000", "100h00PP0@PHFV`Mg5gTH?vNPUIp",
+                   "13eaJF0P00Qd388Eew6aagvH85Ip", "14eGrSPP00ncMJTO5C6aBwvP2D0?",
+                   "15MrVH0000KH<:V:NtBLoqFP2H9:", "15N9NLPP01IS<RFF7fLVmgvN00Rv",
+                   "133sVg0rh0rAjP02Qn4@?wvN2000", "11mg=5HP?wJnJ@0LA5@>4?wp0000")
 
-    def test_E_6(self):
-        self.assertEqual(
-           '!AIVDM,1,1,,A,133sVg0rh0rAjP02Qn4@?wvN2000,0*7D',
-           AIS1_encode(
-              205448892, 0, -20, 0.0, 1, -80.0000, 4.4194417, 6.3, 511, 15, 0, 0, 1, 0 ),
-           "encoding test E_6 failed.")
+       def test_R_1(self):
+           for p in self.payloads:
+               for d in (False, True):
+                   self.assertEqual(AIS1record(p, description=d),
+                      AISpayload1_decode(p, description=d, onlyValid=False),
+                      "record test R_1 failed for " + p)
+                   self.assertEqual(list(AIS1record(p, description=d)),
+                      AISpayload1_decode(p, description=d, onlyValid=False),
+                      "record test R_1 (list) failed for " + p)
 
-    #maritec shows  -19.7  vs  -20 
-    #OpenCPN says    20  deg/min left
+       def test_R_2(self):
+           r = AIS1record("14eGrSPP00ncMJTO5C6aBwvP2D0?")
+           self.assertEqual((r.mmsi, r[2], r[-1], r[5:7]), (316013198, 316013198, 81935, [0.0, True]))
+           self.assertRaises(AttributeError, setattr, r, 'mmsi', 1)   # fields are read only
+           self.assertTrue(cnbCompare(r,
+     (1,0, 316013198, 0, -128.0, 0.0, 1, -130.3162367, 54.3211100, 237.9, 511, 16, 0, 0, 1, 81935)),
+                 "record test R_2 failed.")
+           self.assertRaises(AttributeError, getattr, r, 'other')
+           self.assertTrue(AIS1record("14eGrSPP00ncMJTO5C6aBwvP2D0?", onlyValid=True).RAIM)
+           self.assertRaises(ValueError, AIS1record, "14eGrSPP00ncMJTO5C6aBwvP2D0")
+           self.assertRaises(ValueError, AIS1record, "14eGrSPP00ncMJTO5C6aBwvP2D0x")
+           self.assertRaises(ValueError, AIS1record, "14eGrSPP00ncMJTO5C6aBwvP2D0*")
+           self.assertRaises(ValueError, AIS1record, "14eGrSPP00ncMJTO5C6aBwvP2D0\u00e9")
 
+       def test_R_3(self):
+           # 2s complement for negative ROT, lon and lat
+           r = AIS1record(AISpayload1_encode(mmsi=123456789, ROT=-21, lon=-72.5, lat=-49.25))
+           self.assertEqual((r.ROT, r.lon, r.lat), (-21, -72.5, -49.25))
+           self.assertEqual(AISpayload1_decode(AISpayload1_encode(
+              mmsi=123456789, ROT=-21, lon=-72.5, lat=-49.25), onlyValid=False)[4:9:4],
+              [-21, -49.25])
 
-    def test_D_11(self):    
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode(
-                 "15MrVH0000KH<:V:NtBLoqFP2H9:" , description=False),
-  ( 1, 0, 366913120, 0, 0.0, 0.0, 0, -64.6206617, 18.3211883, 329.5, 299, 16, 0, 0, 1 ),
-              fuzz = 1e-5), # fuzz increased for longitude comparison -64.62065833333334  vs  -64.6206617
-              "decoding test D_11 failed.")
+       def test_P_1(self):
+           for p in self.payloads:
+               cnb = AISpayload1_decode(p, description=False, onlyValid=False)
+               self.assertEqual(AISpayload_peek(p), (cnb[0], cnb[2]), "peek test P_1 failed.")
+           self.assertEqual(AISpayload_peek("B6CdCm0t3`tba35f@V9faHi7kP06"), (18, 423302100))
+           self.assertRaises(ValueError, AISpayload_peek, "14eGr")
 
 
-    def test_D_12(self):    
-        self.assertTrue(
-           cnbCompare(
-              AISpayload1_decode(
-                 "15N9NLPP01IS<RFF7fLVmgvN00Rv" , description=False),
-  ( 1, 0, 367156850, 0, -128.0, 0.1, 0, -90.1784350, 38.6587500, 175.0, 511, 15, 0, 0, 0 ),
-                  fuzz = 1e-5), # fuzz increased for lon comparison -90.17843166666667  vs  -90.178435
-              "decoding test D_12 failed.")
+   ###########       country code tests
 
+   ## ADD CORK EXAMPLES WITH COUNTRY CODES and small gps differences
 
-###########       country code tests
 
-## ADD CORK EXAMPLES WITH COUNTRY CODES and small gps differences
 
 
+   ########################################################################################
 
 
-########################################################################################
+   import sys
 
-if __name__ == '__main__':
-    unittest.main()
+   if len(sys.argv) > 1 and sys.argv[1] == 'bench' :
+      bench()
+   else :
+      unittest.main()
 
 # run this using
 # python3 lib/AIS.py
+# and the benchmark with
+# python3 lib/AIS.py bench
@@ -0,0 +1,494 @@
+
+"""
+Receive GPS locations via LoRa, convert to AIS and multicast on network(UDP).
+Record tracks if set. (Beware space requirement.)
+
+This is the code of the LoRaGPS_base program. Importing it has no side effects:
+the arguments are parsed, and the radio (SX127x) and board are set up, in main().
+The handling of received reports is in class BaseStation, which does not use the
+radio, so it can be used and tested without the LoRa hardware.
+
+The track directory TRACKS_time_stamp is only created when the first report is
+recorded, and the json files are read by the node registry (lib/nodes.py), so the
+radio is listening as soon as possible after a (re)start. The time from start to
+listening is printed (unless quiet).
+
+Each report is also checked for boats close to each other (--proximity), entering
+or leaving zones and rounding marks, as given in GEOFENCES.json (see lib/spatial.py).
+The file is read when it is created or changed. The alerts are printed even if quiet.
+
+examples
+# need  export PYTHONPATH=/path/to/LoRaGPS/lib
+
+from basestation import *
+parseReport('BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z')
+main(['--channel=CH_00_900'])    # as  LoRaGPS_base --channel='CH_00_900'
+"""
+
+# See also examples in  pySX127x.
+
+from time import monotonic
+T0 = monotonic()    # for the time from start to listening
+
+import argparse
+import socket
+import sys
+from time import sleep, strftime
+
+from AIS import AIS1_encode
+from nodes import NodeRegistry, POLICIES
+from spatial import SpatialAlerts, formatEvent
+
+#https://www.rfwireless-world.com/Tutorials/LoRa-channels-list.html
+channels = {
+   'CH_00_900': 903.08, 'CH_01_900': 905.24, 'CH_02_900': 907.40,
+   'CH_03_900': 909.56, 'CH_04_900': 911.72, 'CH_05_900': 913.88,
+   'CH_06_900': 916.04, 'CH_07_900': 918.20, 'CH_08_900': 920.36,
+   'CH_09_900': 922.52, 'CH_10_900': 924.68, 'CH_11_900': 926.84, 'CH_12_900': 915,
+
+   'CH_10_868': 865.20, 'CH_11_868': 865.50, 'CH_12_868': 865.80,
+   'CH_13_868': 866.10, 'CH_14_868': 866.40, 'CH_15_868': 866.70,
+   'CH_16_868': 867   , 'CH_17_868': 868   ,
+   }
+
+# names of SX127x CODING_RATE constants (SX127x is only imported when the radio is set up)
+CodingRates = {"4_5": "CR4_5",  "4_6": "CR4_6",
+               "4_7": "CR4_7",  "4_8": "CR4_8" }
+
+TTL = 20
+
+
+def parseArgs(argv=None):
+   '''
+   Parse command line arguments (sys.argv if argv is None) and check them.
+   '''
+   parser = argparse.ArgumentParser(description=
+              'Receive GPS locations via LoRa, convert to AIS and multicast on network(UDP).')
+
+   parser.add_argument('--quiet', type=bool, default=False,
+                       help='if True suppress local printing. (default: False)')
+
+
+   # following are settings for AIS
+
+   parser.add_argument('--mcast_group', type=str, default='224.1.1.4',
+             help='Network multicast group for AIS output (default: "224.1.1.4")' +
+                   ' If mcast_group is set to "NA" then AIS output is turned off.')
+
+   parser.add_argument('--mcast_port', type=int, default=65433,
+             help='Network multicast port. (default: 65433)')
+
+   # following are settings for the node registry (HOSTNAME_MMSIs.json, ...)
+
+   parser.add_argument('--unknown', type=str, default='ignore',
+             help='Handling of hostnames not in HOSTNAME_MMSIs.json: ' + str(POLICIES) +
+                  ' (default: "ignore" prints the reports only)')
+
+   parser.add_argument('--confirm', type=int, default=3,
+             help='Reports needed from an unknown hostname before it is added with' +
+                  ' --unknown=mmsi or track. (default: 3)')
+
+   parser.add_argument('--mmsi_base', type=int, default=100000000,
+             help='Start of the range of MMSIs allocated for unknown hosts. (default: 100000000)')
+
+
+   # following are settings for alerts (lib/spatial.py)
+
+   parser.add_argument('--geofences', type=str, default='GEOFENCES.json',
+             help='json file with zones, marks and proximity for alerts. It is read' +
+                  ' when it is created or changed, but proximity is only read at start.' +
+                  ' (default: "GEOFENCES.json")')
+
+   parser.add_argument('--proximity', type=float, default=None,
+             help='Distance in metres for alerts of boats close to each other.' +
+                  ' (default: None, the value in the geofences file)')
+
+
+   # following are settings passed to LoRa
+
+   parser.add_argument('--channel', type=str, default='CH_12_900',
+             help='LoRa channel (frequency). (default: "CH_12_900" is 915Mhz)' +
+                  ' The full list of channels is ' + str(channels))
+
+   #parser.add_argument('--freq', type=int, default=915,
+   #          help='LoRa frequency. 169, 315, 433, 868 Mhz. (default: 915)')
+
+   parser.add_argument('--bw', type=int, default=125,
+             help='LoRa bandwidth. 125, 250 and 500 (khz). (default: 125)')
+
+   parser.add_argument('--Cr', type=str, default='4_8',
+             help='LoRa coding rate. (default: "4_8")' +
+                 ' The full list of coding rates is ' + str(list(CodingRates)))
+
+   parser.add_argument('--Sf', type=int, default=7,
+             help='LoRa spreading factor. 7-12, 7-10 at 915Mhz. (default: 7)')
+
+   args = parser.parse_args(argv)
+
+   assert(args.channel in channels)
+   assert(args.Cr in     CodingRates)
+   assert(args.bw in (125, 250, 500))
+   assert(args.Sf in    range(7, 13))
+   assert(args.unknown in POLICIES)
+   assert(args.confirm >= 1)
+   # North America requires 915MHz, Sf 7-10 == 128 - 1024 chips/symbol == 2**7 - 2**10
+
+   # look at this and examples in  pySX127x
+   #from SX127x.LoRaArgumentParser import LoRaArgumentParser
+   #parser = LoRaArgumentParser("Continous LoRa receiver.")
+
+   return(args)
+
+
+###################################################################
+
+def parseReport(rx):
+   '''
+   Parse a report as sent by LoRaGPS_sensor, e.g.
+      'BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z'
+   Return (bt, lat, lon, tm) where bt is the hostname or '#<node id>' and
+   tm is [year, month, day, hr, min, sec] UTC, or None if rx cannot be parsed.
+   '''
+   try:
+      p   = rx.split(' ')
+      bt  = p[0]
+      lat = float(p[1])
+      lon = float(p[2])
+      # tm is year, month, day, hr, min, sec  UTC
+      tm = p[3].replace('Z', '').replace('T', ':').replace('-', ':').split(':')
+      tm = [float(x) for x in tm]  # could use int here
+   except (IndexError, ValueError):
+      return(None)
+   return((bt, lat, lon, tm))
+
+
+class BaseStation(object):
+    '''
+    Handle reports received by the radio: look up the node in the registry,
+    print and record the report, send pseudo AIS and print alerts.
+      registry  NodeRegistry (lib/nodes.py).
+      sock      UDP socket for AIS output. None turns AIS output off.
+      mcast     (group, port) for AIS output.
+      alerts    SpatialAlerts (lib/spatial.py). None turns alerts off.
+      quiet     True/False  is used to turn off/on local printing.
+    The alert events of the last report are in events.
+    '''
+    def __init__(self, registry, sock=None, mcast=None, alerts=None, quiet=False):
+        self.registry = registry
+        self.sock     = sock
+        self.mcast    = mcast
+        self.alerts   = alerts
+        self.quiet    = quiet
+        self.events   = []
+
+    def report(self, rx):
+        '''
+        Handle one received report (str). Return the track record, or None if
+        the report could not be parsed or the node is unknown.
+        '''
+        self.events = []
+        p = parseReport(rx)
+        if p is None : return(None)
+        bt, lat, lon, tm = p
+
+        # bt is a hostname or '#<node id>', unknown hostnames are added by the registry
+        node = self.registry.lookup(bt)
+        if node is None : return(None)
+
+        # dt is just to identify time gaps when testing
+        bt = node.hostname
+        last_tm = node.last_tm
+        dt = 3600 * (tm[3] - last_tm[3]) + 60 * (tm[4] - last_tm[4]) + (tm[5] - last_tm[5])
+
+        record = '%s %f %f %i-%i-%i %i:%i:%rZ  dt=%r s' % \
+           (bt, lat, lon, tm[0], tm[1], tm[2], tm[3], tm[4], tm[5],  dt)
+
+        if not self.quiet : print(record)
+
+        self.registry.record(node, record)
+
+        if self.sock is not None and node.mmsi is not None :
+           ais = AIS1_encode(
+              mmsi=node.mmsi, navStat=0, ROT=128, SOG=1023, PosAcc=0,
+              lon= lon, lat= lat, COG=360, HDG=511, tm=int(tm[5]), mvInd=0,
+              spare=0, RAIM=False, RadStat=0, returnk=False)
+
+           self.sock.sendto(ais.encode(), self.mcast)
+
+        # only nodes in the registry, not names it has not added (possibly corrupted)
+        if self.alerts is not None and node.id is not None :
+           self.events = self.alerts.update(bt, lat, lon)
+           for ev in self.events : print(formatEvent(ev))
+
+        node.last_tm = tm
+        return(record)
+
+    def poll(self):
+        # pick up changes to HOSTNAME_MMSIs.json, TRACK.json, ... and GEOFENCES.json,
+        # and forget boats that stopped reporting (alerts.max_age)
+        self.registry.poll()
+        if self.alerts is not None :
+           self.alerts.poll()
+           for ev in self.alerts.evict() : print(formatEvent(ev))
+
+    def close(self):
+        if self.sock is not None : self.sock.close()
+        self.registry.close()
+
+
+###################################################################
+
+def loraReceiver():
+   '''
+   Import SX127x and return class LoRaGPSrx (a subclass of SX127x.LoRa.LoRa).
+   The import is done here, rather than when this module is imported, so that
+   the module can be used without the LoRa hardware and libraries.
+   '''
+   from SX127x.LoRa import LoRa, MODE, BW, CODING_RATE
+
+   class LoRaGPSrx(LoRa):
+       '''
+         station BaseStation which handles received reports.
+         quiet   True/False  is used to turn off/on local printing.
+       Arguments passed on to class LoRa from SX127x.LoRa
+         freq=915, bw=125, Cr='4_8', Sf=7
+         verbose True/False  is used by pySX127x to print extra information (mode setting).
+         do_calibration=True, calibration_freq=915
+       '''
+       def __init__(self, station, quiet=False,
+              freq=915, bw=125, Cr='4_8', Sf=7,
+              verbose=False, do_calibration=True, calibration_freq=915):
+
+           super(LoRaGPSrx, self).__init__(verbose, do_calibration, calibration_freq)
+
+           self.station=station
+           self.quiet=quiet
+
+
+           # SX127x class LoRa has (Medium Range  Defaults after init):
+           #  Medium Range     434.0MHz, Bw = 125 kHz, Cr = 4/5, Sf =  128chips/symbol, CRC on 13 dBm
+           #  Slow+long range            Bw = 125 kHz, Cr = 4/8, Sf = 4096chips/symbol, CRC on 13 dBm
+
+           # CHECK  CRC on 13 dBm
+
+           self.set_mode(MODE.SLEEP)
+           self.set_freq(freq)
+           self.set_bw((BW.BW125, BW.BW250, BW.BW500)[(125, 250, 500).index(bw)])
+           self.set_coding_rate(getattr(CODING_RATE, CodingRates[Cr]))
+           self.set_spreading_factor(Sf)
+
+           self.set_dio_mapping([0] * 6)
+           self.set_mode(MODE.STDBY)
+           self.set_pa_config(pa_select=1, max_power=21, output_power=15)
+           self.set_rx_crc(False)   #True
+           self.set_low_data_rate_optim(False)  #True
+
+           #.set_pa_ramp(PA_RAMP.RAMP_50_us)
+           #.set_agc_auto_on(True)
+           #.set_pa_config(pa_select=1)
+           #.set_lna_gain(GAIN.G1)
+           #.set_implicit_header_mode(False)
+
+       def on_rx_done(self):
+           # on interupt read LoRa payload
+           self.clear_irq_flags(RxDone=1)
+           payload = self.read_payload(nocheck=True)
+           try:
+              self.station.report(bytes(payload).decode("utf-8",'ignore'))
+           finally:
+              # always go back to listening
+              self.set_mode(MODE.SLEEP)
+              self.reset_ptr_rx()
+              self.set_mode(MODE.RXCONT)
+
+       # on_tx_done, on_cad_done, on_rx_timeout, on_valid_header, on_payload_crc_error
+       # and on_fhss_change_channel are also marked as overridable functions in the
+       # LoRa class definition. See examples in  pySX127x.
+
+       def start(self):
+           self.reset_ptr_rx()
+           self.set_mode(MODE.RXCONT)
+           if not self.quiet :
+              print("\nstarted listening %.3f s after start." % (monotonic() - T0))
+           while True:
+               sleep(.5)
+               self.station.poll()
+               #rssi_value = self.get_rssi_value()
+               #status = self.get_modem_status()
+               #sys.stdout.flush()
+               #sys.stdout.write("\r%d %d %d" % (rssi_value, status['rx_ongoing'], status['modem_clear']))
+
+       def stop(self):
+           self.set_mode(MODE.SLEEP)
+
+   return(LoRaGPSrx)
+
+
+###################################################################
+
+def main(argv=None):
+
+    args  = parseArgs(argv)
+    quiet = args.quiet
+
+    ############# setup for pseudo AIS
+
+    # see https://en.wikipedia.org/wiki/Maritime_Mobile_Service_Identity
+    # HOSTNAME_MMSIs.json gives the hostname to mmsi mapping.
+
+    sock = None
+    if args.mcast_group != 'NA' :
+       sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+       sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, TTL)
+
+    ############# setup for tracking
+
+    # Recording is controlled by TRACK.json, NOT_TRACK.json and HOSTNAME_MMSIs.json,
+    # which are re-read by the node registry when they change (see lib/nodes.py).
+    # The directory is created when the first report is recorded.
+
+    TD='TRACKS_'+strftime("%Y-%m-%d_%H:%M:%S")
+
+    registry = NodeRegistry(track_dir=TD, unknown=args.unknown, confirm=args.confirm,
+                            mmsi_base=args.mmsi_base, quiet=quiet)
+
+    ############# setup for alerts
+
+    # the geofences file is (re)read by station.poll() when it is created or changes
+    alerts = SpatialAlerts(fence_file=args.geofences, proximity=args.proximity)
+
+    station = BaseStation(registry, sock=sock,
+                          mcast=(args.mcast_group, args.mcast_port), alerts=alerts, quiet=quiet)
+
+    ############# setup for LoRa
+
+    from SX127x.board_config import BOARD
+    LoRaGPSrx = loraReceiver()
+
+    BOARD.setup()
+
+    lora = LoRaGPSrx(station, quiet=quiet,
+                 freq=channels[args.channel], bw=args.bw, Cr=args.Cr, Sf=args.Sf,
+                 verbose=False, do_calibration=True, calibration_freq=channels[args.channel])
+
+    if not quiet :  print(lora)
+
+    assert(lora.get_agc_auto_on() == 1)
+    assert(abs(lora.get_freq() - channels[args.channel]) < 0.0001)
+
+    if sock is not None and not quiet :
+       print('network (UDP) multicast group to %s:%i' % (args.mcast_group, args.mcast_port))
+
+    try:
+        lora.start()
+    except KeyboardInterrupt:
+        if not quiet :
+           sys.stdout.flush()
+           print("")
+           sys.stderr.write("Interrupt. ")
+    finally:
+        lora.stop()
+        BOARD.teardown()
+        station.close()
+        if not quiet :
+            sys.stdout.flush()
+            sys.stderr.write("Base station shut down.\n")
+
+
+###########################################################################
+####################### unittest  tests  ##################################
+###########################################################################
+
+if __name__ == '__main__':
+
+   import unittest
+   import os
+   import json
+   import tempfile
+
+   from AIS import AIS1_decode
+
+
+   class TestBaseStation(unittest.TestCase):
+
+       class Sock(object):
+           def __init__(self):  self.sent = []
+           def sendto(self, data, address):  self.sent.append((data, address))
+           def close(self):  pass
+
+       def setUp(self):
+           self.d = tempfile.TemporaryDirectory()
+           fl = lambda x: os.path.join(self.d.name, x)
+           with open(fl('HOSTNAME_MMSIs.json'), 'w') as f:  json.dump({"BT-1": 338654321, "BT-2": 338654322}, f)
+           self.TD = fl('TRACKS')
+           self.registry = NodeRegistry(mmsi_file=fl('HOSTNAME_MMSIs.json'),
+              track_file=fl('TRACK.json'), not_track_file=fl('NOT_TRACK.json'),
+              id_file=fl('NODE_IDS.json'), track_dir=self.TD, quiet=True)
+           self.sock = self.Sock()
+           self.station = BaseStation(self.registry, sock=self.sock,
+                                      mcast=('224.1.1.4', 65433), quiet=True)
+
+       def tearDown(self):
+           self.station.close()
+           self.d.cleanup()
+
+       def test_parse(self):
+           self.assertEqual(parseReport('BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z'),
+              ('BT-1', 45.395798, -75.676875, [2020.0, 5.0, 20.0, 23.0, 18.0, 59.0]))
+           self.assertIsNone(parseReport('Started transmit from BT-1.'))
+           self.assertIsNone(parseReport('BT-1 None None NoneTNone'))
+
+       def test_report(self):
+           self.assertFalse(os.path.exists(self.TD))   # not created until needed
+           r = self.station.report('BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z')
+           self.assertEqual(r.split('  ')[0], 'BT-1 45.395798 -75.676875 2020-5-20 23:18:59.0Z')
+           r = self.station.report('#1 45.395898 -75.676875 2020-05-20T23:19:14.00Z')
+           self.assertEqual(r, 'BT-1 45.395898 -75.676875 2020-5-20 23:19:14.0Z  dt=15.0 s')
+           self.assertIsNone(self.station.report('#7 45.395898 -75.676875 2020-05-20T23:19:14.00Z'))
+           self.assertIsNone(self.station.report('garbage'))
+           self.assertEqual(len(self.sock.sent), 2)
+           cnb = AIS1_decode(self.sock.sent[1][0].decode(), description=False)
+           self.assertEqual((cnb[2], cnb[11]), (338654321, 14))
+           self.assertAlmostEqual(cnb[8], 45.395898, places=5)
+           self.registry.close()
+           with open(os.path.join(self.TD, 'BT-1.txt')) as f:
+              self.assertEqual(len(f.readlines()), 2)
+
+       def test_alerts(self):
+           self.station.alerts = SpatialAlerts(proximity=20)
+           self.station.report('BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z')
+           self.assertEqual(self.station.events, [])
+           self.station.report('BT-2 45.395898 -75.676875 2020-05-20T23:18:59.00Z')
+           self.assertEqual([e[:3] for e in self.station.events], [('near', 'BT-2', 'BT-1')])
+           self.station.report('#1 45.396798 -75.676875 2020-05-20T23:19:14.00Z')
+           self.assertEqual(self.station.events, [('clear', 'BT-1', 'BT-2')])
+           self.assertIsNone(self.station.report('garbage'))
+           self.assertEqual(self.station.events, [])
+
+       def test_alerts_evict(self):
+           self.station.alerts = SpatialAlerts(proximity=20, max_age=0.5)
+           self.station.report('BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z')
+           self.station.alerts.seen['BT-1'] -= 1.0      # last fix 1 s ago
+           self.station.poll()
+           self.assertEqual(self.station.alerts.pos, {})
+           self.station.report('BT-2 45.395898 -75.676875 2020-05-20T23:18:59.00Z')
+           self.assertEqual(self.station.events, [])
+
+       def test_alerts_unknown(self):
+           # a corrupted hostname (CRC is off) is not added and gives no alerts
+           self.station.alerts = SpatialAlerts(proximity=20)
+           self.station.report('BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z')
+           self.assertIsNotNone(self.station.report('BT-\x01 45.395798 -75.676875 2020-05-20T23:18:59.00Z'))
+           self.assertEqual(self.station.events, [])
+           self.assertEqual(list(self.station.alerts.pos), ['BT-1'])
+
+       def test_no_ais(self):
+           self.station.sock = None
+           self.assertIsNotNone(self.station.report('BT-2 45.3 -75.6 2020-05-20T23:18:59.00Z'))
+           self.assertEqual(self.sock.sent, [])
+
+
+   unittest.main()
+
+# run this using
+# python3 lib/basestation.py
@@ -0,0 +1,491 @@
+
+'''
+Registry of sensor systems (nodes) known to the base station.
+
+The registry holds the hostname to MMSI mapping (HOSTNAME_MMSIs.json), the
+tracking lists (TRACK.json and NOT_TRACK.json) and a compact numeric node id
+for each hostname (NODE_IDS.json). The files are re-read when they change, so
+a boat can be added to a running base station by editing the json files.
+
+Hosts that are not in HOSTNAME_MMSIs.json are handled according to a policy:
+   'ignore'  reports are dropped (printed but no AIS and no track, the default).
+   'mmsi'    a local MMSI is allocated, no track is recorded.
+   'track'   a local MMSI is allocated and the host is tracked following the
+             same rules as configured hosts.
+The radio receives with CRC off, so a corrupted frame can carry a hostname that
+does not exist. With 'mmsi' and 'track' a host is only added after confirm
+reports with the same hostname, and ignored hosts are not added at all, so a
+corrupted name does not become a boat with an MMSI, a node id and a track file.
+Allocated MMSIs are computed from the hostname, so a host normally gets the same
+MMSI again after a restart. They are local identifiers only, like the ones in
+HOSTNAME_MMSIs.json.
+
+Node ids are small integers that are kept in NODE_IDS.json once assigned. A sensor
+system can send '#<id>' (e.g. '#3') in place of its hostname to shorten the LoRa
+frame. The registry resolves either form.
+
+examples
+# need  export PYTHONPATH=/path/to/LoRaGPS/lib
+
+from nodes import NodeRegistry
+reg  = NodeRegistry(track_dir='TRACKS_test')
+node = reg.lookup('BT-1')      # or reg.lookup('#1')
+node.mmsi, node.id, node.tracked
+reg.record(node, 'BT-1 45.395798 -75.676875 2020-5-20 23:18:59.0Z  dt=13.0 s')
+reg.poll()                     # re-read the json files if they changed
+reg.close()
+'''
+
+import os
+import sys
+import json
+import threading
+import zlib
+
+POLICIES = ('ignore', 'mmsi', 'track')
+
+
+class Node(object):
+    '''
+    Information about one sensor system. Attributes are
+      hostname  as sent by the sensor system.
+      id        compact numeric node id.
+      mmsi      MMSI used for pseudo AIS, None if AIS is not sent for the node.
+      tracked   True if reports are recorded in the track file.
+      allocated True if the MMSI was allocated by the registry (unknown host).
+      last_tm   time of last report [year, month, day, hr, min, sec] (set by the caller).
+    '''
+    __slots__ = ('hostname', 'id', 'mmsi', 'tracked', 'allocated', 'last_tm')
+
+    def __init__(self, hostname, id, mmsi=None, tracked=False, allocated=False):
+        self.hostname  = hostname
+        self.id        = id
+        self.mmsi      = mmsi
+        self.tracked   = tracked
+        self.allocated = allocated
+        self.last_tm   = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+    def __repr__(self):
+        return('Node(%r, id=%r, mmsi=%r, tracked=%r, allocated=%r)' %
+           (self.hostname, self.id, self.mmsi, self.tracked, self.allocated))
+
+
+class NodeRegistry(object):
+    '''
+      mmsi_file, track_file, not_track_file, id_file  json files, see module notes.
+                  None for id_file means node ids are not saved.
+      track_dir   directory for track files. The directory is created and track files
+                  are opened when the first report for a node is recorded.
+                  None turns off recording.
+      unknown     policy for hosts not in mmsi_file, one of POLICIES.
+      confirm     number of reports from an unknown host before it is added.
+      mmsi_base, mmsi_span  range used for allocated MMSIs.
+      quiet       True/False  is used to turn off/on local printing.
+
+    lookup() is intended for the radio callback. It only does dictionary lookups
+    unless the host is new, and does no file i/o. poll() checks the json files,
+    saves new node ids, and should be called from the main loop, not from the callback.
+    '''
+
+    def __init__(self, mmsi_file='HOSTNAME_MMSIs.json', track_file='TRACK.json',
+           not_track_file='NOT_TRACK.json', id_file='NODE_IDS.json',
+           track_dir=None, unknown='ignore', confirm=3,
+           mmsi_base=100000000, mmsi_span=1000000, quiet=False):
+
+        if unknown not in POLICIES:
+           raise ValueError('unknown policy must be one of ' + str(POLICIES))
+
+        self.mmsi_file      = mmsi_file
+        self.track_file     = track_file
+        self.not_track_file = not_track_file
+        self.id_file        = id_file
+        self.track_dir      = track_dir
+        self.unknown        = unknown
+        self.confirm        = confirm
+        self.mmsi_base      = mmsi_base
+        self.mmsi_span      = mmsi_span
+        self.quiet          = quiet
+
+        self._lock     = threading.Lock()
+        self._by_name  = {}     # hostname -> Node
+        self._by_id    = {}     # node id  -> Node
+        self._handles  = {}     # hostname -> open track file
+        self._stamps   = None
+        self._mmsis    = {}     # configured hostname -> mmsi
+        self._track    = None   # list from TRACK.json, or None
+        self._not_track = ()
+        self._pending  = {}     # unknown hostname -> reports seen so far
+        self._ids_dirty = False  # node ids not yet saved
+
+        self.poll()
+
+    ############# configuration files
+
+    def _stamp(self):
+        s = []
+        for fl in (self.mmsi_file, self.track_file, self.not_track_file, self.id_file):
+            try:
+               st = os.stat(fl)
+               s.append((st.st_mtime_ns, st.st_size))
+            except (OSError, TypeError):    # TypeError for fl None (not used)
+               s.append(None)
+        return(tuple(s))
+
+    def poll(self):
+        '''
+        Re-read the json files if any of them has changed since the last read.
+        Return True if the configuration was reloaded. If a file cannot be parsed
+        or has the wrong content (e.g. it is being edited) the previous
+        configuration is kept.
+        '''
+        if self._ids_dirty :
+           with self._lock:
+              self._ids_dirty = False
+              self._writeIds()
+
+        stamps = self._stamp()
+        if stamps == self._stamps : return(False)
+
+        try:
+           mmsis     = _readJSON(self.mmsi_file, {}, dict)
+           track     = _readJSON(self.track_file, None, list)
+           not_track = _readJSON(self.not_track_file, [], list)
+           ids       = _readJSON(self.id_file, {}, dict)
+           mmsis     = dict((str(h), int(m)) for h, m in mmsis.items())
+           track     = None if track is None else set(str(h) for h in track)
+           not_track = set(str(h) for h in not_track)
+           ids       = dict((str(h), int(i)) for h, i in ids.items())
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+           # leave _stamps unchanged so the files are read again on the next poll
+           sys.stderr.write('Node registry not reloaded: %s\n' % e)
+           return(False)
+
+        with self._lock:
+           self._stamps    = stamps
+           self._mmsis     = mmsis
+           self._track     = track
+           self._not_track = not_track
+
+           by_name = dict(self._by_name)
+           by_id   = dict(self._by_id)
+           new_ids = False
+
+           for h, i in ids.items():
+               if h not in by_name and i not in by_id :
+                  n = Node(h, i)
+                  by_name[h] = n
+                  by_id[i]   = n
+
+           for h in sorted(self._mmsis):
+               if h not in by_name :
+                  n = Node(h, self._nextId(by_id))
+                  by_name[h] = n
+                  by_id[n.id] = n
+                  new_ids = True
+
+           for n in by_name.values(): self._configure(n, by_name)
+
+           # replace (not update) the dicts, lookup() does not take the lock
+           self._by_name = by_name
+           self._by_id   = by_id
+
+           if new_ids : self._writeIds()
+
+        if not self.quiet :
+           print('node registry loaded: %i configured, %i known hosts.' %
+                 (len(self._mmsis), len(self._by_name)))
+        return(True)
+
+    def _configure(self, node, by_name):
+        # set mmsi and tracked for node from the current configuration
+        h = node.hostname
+        if h in self._mmsis :
+           node.mmsi      = self._mmsis[h]
+           node.allocated = False
+           known = True
+        elif self.unknown == 'ignore' :
+           node.mmsi      = None
+           node.allocated = False
+           known = False
+        else :
+           if not node.allocated : node.mmsi = self._allocate(h, by_name)
+           node.allocated = True
+           known = self.unknown == 'track'
+
+        if self._track is not None :
+           node.tracked = h in self._track
+        else :
+           node.tracked = known and h not in self._not_track
+
+    def _nextId(self, by_id):
+        return(max(by_id) + 1 if by_id else 1)
+
+    def _allocate(self, hostname, by_name):
+        # MMSI from a hash of the hostname, so it is usually the same after a restart.
+        used = set(self._mmsis.values())
+        used.update(n.mmsi for n in by_name.values() if n.allocated)
+        k = zlib.crc32(hostname.encode()) % self.mmsi_span
+        for j in range(self.mmsi_span):
+            m = self.mmsi_base + (k + j) % self.mmsi_span
+            if m not in used : return(m)
+        raise RuntimeError('no local MMSI available for ' + hostname)
+
+    def _writeIds(self):
+        if self.id_file is None : return
+        ids = dict((n.hostname, n.id) for n in self._by_id.values())
+        tmp = self.id_file + '.tmp'
+        try:
+           with open(tmp, 'w') as f:  json.dump(ids, f, indent=1, sort_keys=True)
+           os.replace(tmp, self.id_file)
+        except OSError as e:
+           sys.stderr.write('Node ids not saved: %s\n' % e)
+           return
+        # do not trigger a reload for our own write
+        if self._stamps is not None :
+           self._stamps = self._stamps[:3] + self._stamp()[3:]
+
+    ############# hot path
+
+    def lookup(self, name):
+        '''
+        Return the Node for a hostname or '#<id>'. A new hostname is added according
+        to the unknown policy. Until then (or with policy 'ignore') a Node that is
+        not kept is returned, with id and mmsi None. None is returned for an
+        unassigned '#<id>'.
+        '''
+        n = self._by_name.get(name)
+        if n is not None : return(n)
+
+        if name[:1] == '#' :
+           try:
+              return(self._by_id.get(int(name[1:])))
+           except ValueError:
+              return(None)
+
+        if self.unknown == 'ignore' : return(self._transient(name))
+
+        with self._lock:
+           n = self._by_name.get(name)
+           if n is not None : return(n)
+
+           k = self._pending.get(name, 0) + 1
+           if k < self.confirm :
+              # bound the memory used by corrupted names
+              if len(self._pending) >= 1000 : self._pending.clear()
+              self._pending[name] = k
+              return(self._transient(name))
+           self._pending.pop(name, None)
+
+           by_name = dict(self._by_name)
+           by_id   = dict(self._by_id)
+           n = Node(name, self._nextId(by_id))
+           self._configure(n, by_name)
+           by_name[name] = n
+           by_id[n.id]   = n
+           self._by_name = by_name
+           self._by_id   = by_id
+           self._ids_dirty = True     # saved by poll()
+        if not self.quiet :
+           print('new host %s: node id %i, mmsi %s, tracked %s' %
+                 (name, n.id, n.mmsi, n.tracked))
+        return(n)
+
+    def _transient(self, name):
+        # Node for a host that is not added: no id, no MMSI, tracked only if in TRACK.json
+        n = Node(name, None)
+        n.tracked = self._track is not None and name in self._track
+        return(n)
+
+    def __len__(self):
+        return(len(self._by_name))
+
+    def __iter__(self):
+        return(iter(list(self._by_name.values())))
+
+    ############# tracks
+
+    def record(self, node, record):
+        '''
+        Write record (a line without '\\n') to the track file of node if it is tracked.
+        '''
+        if not node.tracked or self.track_dir is None : return
+        f = self._handles.get(node.hostname)
+        if f is None :
+           if not os.path.isdir(self.track_dir) : os.makedirs(self.track_dir)
+           f = open(os.path.join(self.track_dir, node.hostname + '.txt'), 'a')
+           self._handles[node.hostname] = f
+        f.write(record + "\n")
+
+    def close(self):
+        if self._ids_dirty :
+           self._ids_dirty = False
+           self._writeIds()
+        for f in self._handles.values():
+            f.close()
+        self._handles = {}
+
+
+def _readJSON(fl, default, kind):
+    # kind is dict or list, the json type the file must contain
+    if fl is None or not os.path.isfile(fl) : return(default)
+    with open(fl, 'r') as f:  x = json.load(f)
+    if not isinstance(x, kind) :
+       raise TypeError('%s must contain a json %s' % (fl, kind.__name__))
+    return(x)
+
+
+###########################################################################
+####################### unittest  tests  ##################################
+###########################################################################
+
+if __name__ == '__main__':
+
+   import unittest
+   import tempfile
+
+
+   class TestNodeRegistry(unittest.TestCase):
+
+       def setUp(self):
+           self.d = tempfile.TemporaryDirectory()
+           self.fl = lambda x: os.path.join(self.d.name, x)
+           self.write('HOSTNAME_MMSIs.json', {"mqtt1": 316456789, "BT-1": 338654321})
+
+       def tearDown(self):
+           self.d.cleanup()
+
+       def write(self, name, x):
+           with open(self.fl(name), 'w') as f:  json.dump(x, f)
+           # make sure the change is seen even on coarse mtime file systems
+           st = os.stat(self.fl(name))
+           os.utime(self.fl(name), ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+       def registry(self, **kw):
+           return(NodeRegistry(
+              mmsi_file=self.fl('HOSTNAME_MMSIs.json'), track_file=self.fl('TRACK.json'),
+              not_track_file=self.fl('NOT_TRACK.json'), id_file=self.fl('NODE_IDS.json'),
+              track_dir=os.path.join(self.d.name, 'TRACKS'), quiet=True, **kw))
+
+       def test_configured(self):
+           r = self.registry()
+           self.assertEqual(r.lookup('BT-1').mmsi, 338654321)
+           self.assertEqual(r.lookup('BT-1').id, 1)   # sorted hostnames
+           self.assertEqual(r.lookup('mqtt1').id, 2)
+           self.assertTrue(r.lookup('mqtt1').tracked)
+           self.assertIs(r.lookup('#2'), r.lookup('mqtt1'))
+           self.assertIsNone(r.lookup('#9'))
+           self.assertIsNone(r.lookup('#x'))
+
+       def test_track_lists(self):
+           self.write('NOT_TRACK.json', ["mqtt1"])
+           r = self.registry()
+           self.assertFalse(r.lookup('mqtt1').tracked)
+           self.assertTrue(r.lookup('BT-1').tracked)
+           self.write('TRACK.json', ["mqtt1"])
+           self.assertTrue(r.poll())
+           self.assertTrue(r.lookup('mqtt1').tracked)
+           self.assertFalse(r.lookup('BT-1').tracked)
+
+       def test_unknown_policy(self):
+           r = self.registry()
+           self.assertIsNone(r.lookup('BT-9').mmsi)
+           self.assertFalse(r.lookup('BT-9').tracked)
+           self.assertIsNone(r.lookup('BT-9').id)
+           self.assertEqual(len(r), 2)      # not added
+           r.poll()
+           self.assertFalse(os.path.exists(self.fl('NODE_IDS.json.tmp')))
+           with open(self.fl('NODE_IDS.json')) as f:
+              self.assertNotIn('BT-9', json.load(f))
+           r = self.registry(unknown='mmsi', confirm=1)
+           self.assertTrue(100000000 <= r.lookup('BT-8').mmsi < 101000000)
+           self.assertFalse(r.lookup('BT-8').tracked)
+           r = self.registry(unknown='track', confirm=1)
+           n = r.lookup('BT-7')
+           self.assertTrue(n.tracked and n.allocated)
+           self.assertRaises(ValueError, self.registry, unknown='other')
+
+       def test_confirm(self):
+           # a corrupted hostname seen once is not added
+           r = self.registry(unknown='track', confirm=3)
+           self.assertIsNone(r.lookup('BT-1x').mmsi)
+           self.assertIsNone(r.lookup('BT-6').mmsi)
+           self.assertIsNone(r.lookup('BT-6').mmsi)
+           n = r.lookup('BT-6')
+           self.assertTrue(n.allocated and n.tracked)
+           self.assertIs(r.lookup('BT-6'), n)
+           self.assertNotIn('BT-1x', [x.hostname for x in r])
+           with open(self.fl('NODE_IDS.json')) as f:
+              self.assertNotIn('BT-6', json.load(f))   # not written in lookup()
+           r.poll()      # saves the new id
+           with open(self.fl('NODE_IDS.json')) as f:
+              self.assertEqual(json.load(f)['BT-6'], n.id)
+
+       def test_reload(self):
+           r = self.registry(unknown='track', confirm=1)
+           n = r.lookup('BT-2')
+           self.assertTrue(n.allocated)
+           self.assertFalse(r.poll())
+           self.write('HOSTNAME_MMSIs.json',
+                      {"mqtt1": 316456789, "BT-1": 338654321, "BT-2": 316000002})
+           self.assertTrue(r.poll())
+           self.assertIs(r.lookup('BT-2'), n)
+           self.assertEqual(n.mmsi, 316000002)
+           self.assertFalse(n.allocated)
+
+       def badPoll(self, r):
+           stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+           try:
+              return(r.poll())
+           finally:
+              sys.stderr.close()
+              sys.stderr = stderr
+
+       def test_bad_file_kept(self):
+           r = self.registry()
+           with open(self.fl('HOSTNAME_MMSIs.json'), 'w') as f:  f.write('{"BT-1": ')
+           st = os.stat(self.fl('HOSTNAME_MMSIs.json'))
+           os.utime(self.fl('HOSTNAME_MMSIs.json'), ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+           self.assertFalse(self.badPoll(r))
+           self.assertEqual(r.lookup('BT-1').mmsi, 338654321)
+
+       def test_bad_content_kept(self):
+           # valid json with the wrong content
+           r = self.registry()
+           for name, x in (('HOSTNAME_MMSIs.json', {"BT-1": None}),
+                           ('HOSTNAME_MMSIs.json', {"BT-1": "3386 54321"}),
+                           ('HOSTNAME_MMSIs.json', ["BT-1"]),
+                           ('TRACK.json', "BT-1"),
+                           ('NOT_TRACK.json', {"BT-1": 1}),
+                           ('NODE_IDS.json', {"BT-1": "one"})):
+               self.write(name, x)
+               self.assertFalse(self.badPoll(r))
+               self.assertFalse(self.badPoll(r))    # retried, still bad
+               self.assertEqual(r.lookup('BT-1').mmsi, 338654321)
+               self.assertTrue(r.lookup('BT-1').tracked)
+               os.remove(self.fl(name))
+           self.write('HOSTNAME_MMSIs.json', {"BT-1": 338654321})
+           self.assertTrue(r.poll())
+
+       def test_ids_persist(self):
+           r = self.registry(unknown='mmsi', confirm=1)
+           i = r.lookup('BT-5').id
+           r.poll()
+           r = self.registry(unknown='mmsi')
+           self.assertEqual(r.lookup('#%i' % i).hostname, 'BT-5')
+           self.assertEqual(r.lookup('BT-5').mmsi,
+                            self.registry(unknown='mmsi').lookup('BT-5').mmsi)
+
+       def test_record(self):
+           r = self.registry()
+           self.assertFalse(os.path.exists(self.fl('TRACKS')))
+           r.record(r.lookup('BT-1'), 'BT-1 45.0 -75.0')
+           r.record(r.lookup('#1'),   'BT-1 45.1 -75.1')
+           r.close()
+           with open(self.fl('TRACKS/BT-1.txt')) as f:
+              self.assertEqual(f.read(), 'BT-1 45.0 -75.0\nBT-1 45.1 -75.1\n')
+
+
+   unittest.main()
+
+# run this using
+# python3 lib/nodes.py
@@ -0,0 +1,429 @@
+
+'''
+Read GPS using serial (not gpsd) and send GPS location via LoRa.
+This needs gpsd NOT running (it blocks serial).
+   sudo systemctl stop  gpsd
+   sudo systemctl disable  gpsd
+
+This is the code of the LoRaGPS_sensor program. Importing it has no side effects:
+the arguments are parsed, and the serial port, radio (SX127x) and board are set up,
+in main(). The serial GPS reader is started before the radio is calibrated so that
+a fix is usually available by the time the first report is sent.
+
+examples
+# need  export PYTHONPATH=/path/to/LoRaGPS/lib
+
+from sensor import *
+parseNMEA0183('$GPGLL,4523.74678,N,07540.61550,W,181118.00,A,A*70')
+main(['--report=15.0'])    # as  LoRaGPS_sensor --report=15.0
+'''
+# see
+#  https://www.gpsinformation.org/dale/nmea.htm for NMEA sentence info.
+#  https://www.u-blox.com/sites/default/files/products/documents/u-blox6_ReceiverDescrProtSpec_%28GPS.G6-SW-10018%29_Public.pdf
+#    for ublox 6 details including controls
+
+# See examples in  pySX127x  for more LoRa info.
+
+from time import monotonic
+T0 = monotonic()    # for the time from start to the first transmission
+
+import argparse
+import sys
+from socket import gethostname
+from time import sleep, strftime
+
+import threading, signal
+
+import logging
+
+#in decreasing order CRITICAL, ERROR, WARNING. INFO, DEBUG
+# level logs everything higher. NOTSET looks to parent levels
+
+# basicConfig can only be set once in a python session. Additional calls ignored.
+#logging.basicConfig(level=logging.DEBUG, format='(%(threadName)-9s) %(message)s')
+#logging.basicConfig(level=logging.INFO, format='(%(threadName)-9s) %(message)s')
+#logging.debug('message level debug.')
+
+#https://www.rfwireless-world.com/Tutorials/LoRa-channels-list.html
+channels = {
+   'CH_00_900': 903.08, 'CH_01_900': 905.24, 'CH_02_900': 907.40,
+   'CH_03_900': 909.56, 'CH_04_900': 911.72, 'CH_05_900': 913.88,
+   'CH_06_900': 916.04, 'CH_07_900': 918.20, 'CH_08_900': 920.36,
+   'CH_09_900': 922.52, 'CH_10_900': 924.68, 'CH_11_900': 926.84, 'CH_12_900': 915,
+
+   'CH_10_868': 865.20, 'CH_11_868': 865.50, 'CH_12_868': 865.80,
+   'CH_13_868': 866.10, 'CH_14_868': 866.40, 'CH_15_868': 866.70,
+   'CH_16_868': 867   , 'CH_17_868': 868   ,
+   }
+
+# names of SX127x CODING_RATE constants (SX127x is only imported when the radio is set up)
+CodingRates = {"4_5": "CR4_5",  "4_6": "CR4_6",
+               "4_7": "CR4_7",  "4_8": "CR4_8" }
+
+
+def parseArgs(argv=None):
+   '''
+   Parse command line arguments (sys.argv if argv is None) and check them.
+   '''
+   parser = argparse.ArgumentParser(description=
+              'Read GPS using serial (not gpsd) and send GPS location via LoRa.')
+
+   parser.add_argument('--report', type=float, default=15.0,
+                       help='Reporting interval in seconds. (default: 15.0)')
+
+   parser.add_argument('--quiet', type=bool, default=False,
+                       help='if True suppress local printing. (default: False)')
+
+   parser.add_argument('--node_id', type=int, default=None,
+             help='Send "#node_id" rather than the hostname to identify this system.' +
+                  ' The id is assigned by the base station (see NODE_IDS.json there).' +
+                  ' (default: None, send hostname)')
+
+   parser.add_argument('--port', type=str, default='/dev/serial0',
+             help='Serial port of the GPS. (default: "/dev/serial0")')
+
+   # following are settings passed to LoRa
+
+   parser.add_argument('--channel', type=str, default='CH_12_900',
+             help='LoRa channel (frequency). (default: "CH_12_900" is 915Mhz)' +
+                  ' The full list of channels is ' + str(channels))
+
+   #parser.add_argument('--freq', type=int, default=915,
+   #          help='LoRa frequency. 169, 315, 433, 868, 915 Mhz. (default: 915)')
+
+   parser.add_argument('--bw', type=int, default=125,
+             help='LoRa bandwidth. 125, 250 and 500 (khz). (default: 125)')
+
+   parser.add_argument('--Cr', type=str, default='4_8',
+             help='LoRa coding rate. (default: "4_8")' +
+                 ' The full list of coding rates is ' + str(list(CodingRates)))
+
+   parser.add_argument('--Sf', type=int, default=7,
+             help='LoRa spreading factor. 7-12, 7-10 at 915Mhz. (default: 7)')
+
+
+   args = parser.parse_args(argv)
+
+   assert(args.channel  in  channels)
+   assert(args.Cr in     CodingRates)
+   assert(args.bw in (125, 250, 500))
+   assert(args.Sf in    range(7, 13))
+
+   return(args)
+
+
+###################################################################
+
+def parseNMEA0183(rxx):
+
+   #rxx = '$GPGGA,181119.00,4523.74678,N,07540.61545,W,1,08,1.13,62.8,M,-34.2,M,,*5F'
+   #rxx = '$GPRMC,181124.00,A,4523.74681,N,07540.61529,W,0.035,,030520,,,A*6C'
+   #rxx = '$GPGLL,4523.74678,N,07540.61550,W,181118.00,A,A*70'
+
+   rxx = rxx.split(',')
+   # degree, minutes DDDMM.MMMMM to decimal degrees
+
+   if rxx[0] == '$GPGGA' :
+      tm = rxx[1][0:2] + ":" + rxx[1][2:4] + ":" + rxx[1][4:] + "Z"
+      lat = (-1, 1)[ rxx[3] == 'N'] * (float(rxx[2][0:2]) + float(rxx[2][2:])/60 )
+      lon = (-1, 1)[ rxx[5] == 'E'] * (float(rxx[4][0:3]) + float(rxx[4][3:])/60 )
+      date = None
+   elif rxx[0] == '$GPRMC' :
+      tm = rxx[1][0:2] + ":" + rxx[1][2:4] + ":" + rxx[1][4:] + "Z"
+      lat = (-1, 1)[ rxx[4] == 'N'] * (float(rxx[3][0:2]) + float(rxx[3][2:])/60 )
+      lon = (-1, 1)[ rxx[6] == 'E'] * (float(rxx[5][0:3]) + float(rxx[5][3:])/60 )
+      # speed[7] in knots, true course [8]
+      date = rxx[9][0:2] + "/" + rxx[9][2:4] + "/" +rxx[9][4:6]
+   elif rxx[0] == '$GPGLL' :
+      tm = rxx[5][0:2] + ":" + rxx[5][2:4] + ":" + rxx[5][4:] + "Z"
+      lat = (-1, 1)[ rxx[2] == 'N'] * (float(rxx[1][0:2]) + float(rxx[1][2:])/60 )
+      lon = (-1, 1)[ rxx[4] == 'E'] * (float(rxx[3][0:3]) + float(rxx[3][3:])/60 )
+      date = None
+   else:
+      tm = None
+      lat = float('NaN')
+      lon = float('NaN')
+      date = None
+
+   if tm is not None :
+      p = (lat, lon, tm, date)
+   else :
+      p = None
+
+   return(p)
+
+
+###################################################################
+
+class serialGPS(threading.Thread):
+   """
+   Threading object used to read serial GPS and maintain current information.
+   The information is kept in attributes lat, lon, tm, date and used by the
+   LoRaGPStx instance to broadcast.
+
+   This process keeps the most recent lat, lon, dateTtime, ...
+   (A timeout might set values to null if they get too old, to avoid illusion
+   that GPS is working, but that is not yet implemented. But the data does have
+   a time stamo, so that may be unnecessary)
+   """
+
+   def __init__(self, shutdown, port = "/dev/serial0"):
+      threading.Thread.__init__(self)
+
+      import serial  # from Pyserial
+
+      self.name='serialGPS'
+      self.shutdown = shutdown
+      self.ser = serial.Serial(port, baudrate = 9600, timeout = 0.5)
+
+      #Store date for use with NMEA sentences that do not return it.
+      self.date = None
+      self.lat  = None
+      self.lon  = None
+      self.tm   = None
+
+      #self.sleepInterval = 0.1 # between reading GPS, may not be needed
+      #logging.debug('serialGPS initialized.')
+
+   def run(self):
+      logging.info('serialGPS started')
+
+      while not self.shutdown.is_set():
+          # Wrapped in try for case when read fails.
+          try :
+              rx = self.ser.readline().decode()
+              self.update(rx)
+          except :
+             #logging.debug('ser.readline exception.')
+             pass
+
+          #sleep(self.sleepInterval)
+
+      logging.info('exiting serialGPS thread.')
+
+   def update(self, rx):
+      p = parseNMEA0183(rx)
+      if p is not None :
+         self.lat = p[0]
+         self.lon = p[1]
+         self.tm  = p[2]
+         if p[3] is not None :
+            dt = p[3].split('/')
+            dt.reverse()
+            self.date = '20' + '-'.join(dt)
+
+
+def reportText(hn, gps):
+   '''
+   Report sent by LoRa, e.g. 'BT-1 45.395798 -75.676875 2020-05-20T23:18:59.00Z'
+   hn is the hostname or '#<node id>', gps has attributes lat, lon, tm, date.
+   '''
+   return(hn + ' ' + str(gps.lat) + ' ' + str(gps.lon)  + ' ' + str(gps.date) + 'T' + str(gps.tm))
+
+
+###################################################################
+
+def loraTransmitter():
+   '''
+   Import SX127x and return class LoRaGPStx (a subclass of SX127x.LoRa.LoRa).
+   The import is done here, rather than when this module is imported, so that
+   the module can be used without the LoRa hardware and libraries.
+   '''
+   from SX127x.LoRa import LoRa, MODE, BW, CODING_RATE
+
+   class LoRaGPStx(LoRa):
+       '''
+         gps                 serialGPS (or other object with lat, lon, tm, date) to report.
+         hn                  hostname or '#<node id>' sent to identify the system.
+         ReportInterval      in seconds controls how often the location report is sent.
+         quiet   True/False  is used to turn off/on local printing.
+       Arguments passed on to class LoRa from SX127x.LoRa
+         freq=915, bw=125, Cr='4_8', Sf=7,
+         verbose True/False  is used by pySX127x to print extra information (mode setting).
+         do_calibration=True, calibration_freq=915
+       '''
+
+       def __init__(self, gps, hn, ReportInterval=1.0, quiet=False,
+              freq=915, bw=125, Cr='4_8', Sf=7,
+              verbose=False, do_calibration=True, calibration_freq=915):
+
+           super(LoRaGPStx, self).__init__(verbose, do_calibration, calibration_freq)
+
+           self.gps=gps
+           self.hn=hn
+           self.ReportInterval=ReportInterval
+           self.quiet=quiet
+
+           self.set_mode(MODE.SLEEP)
+           self.set_dio_mapping([1,0,0,0,0,0])
+
+           #self.set_pa_config(pa_select=1)
+           self.set_pa_config(pa_select=1, max_power=21, output_power=15)
+           #self.set_pa_config(max_power=0x04, output_power=0x0F)
+           #self.set_pa_config(max_power=0x04, output_power=0b01000000)
+
+           self.set_freq(freq)
+
+           self.set_bw((BW.BW125, BW.BW250, BW.BW500)[(125, 250, 500).index(bw)])
+
+           self.set_coding_rate(getattr(CODING_RATE, CodingRates[Cr]))
+
+           self.set_spreading_factor(Sf)
+
+           #self.set_agc_auto_on(True)
+           self.set_rx_crc(False)   #True
+           #self.set_pa_ramp(PA_RAMP.RAMP_50_us)
+           #self.set_lna_gain(GAIN.G1)
+           #self.set_lna_gain(GAIN.NOT_USED)
+           #self.set_implicit_header_mode(False)
+           self.set_low_data_rate_optim(False)  #True
+
+       def on_rx_done(self):
+           #print(self.get_irq_flags())
+           print(map(hex, self.read_payload(nocheck=True)))
+           self.set_mode(MODE.SLEEP)
+           self.reset_ptr_rx()
+           self.set_mode(MODE.RXCONT)
+
+       def on_tx_done(self):
+           self.set_mode(MODE.STDBY)
+           self.clear_irq_flags(TxDone=1)
+           sleep(self.ReportInterval)
+
+           x = reportText(self.hn, self.gps)
+           if not self.quiet :
+              #sys.stdout.flush()
+              #if not self.quiet : sys.stdout.write(".")
+              print(x)
+              #print([ord(ch) for ch in x])
+           self.write_payload([ord(ch) for ch in x])
+           self.set_mode(MODE.TX)
+
+       def start(self):
+           if not self.quiet : sys.stdout.write("\rstart")
+           x='Started transmit from ' + self.hn + '.'
+           #print( [ord(ch) for ch in x])
+           self.write_payload([ord(ch) for ch in x])
+           self.set_mode(MODE.TX)
+           if not self.quiet :
+              print(" transmitting %.3f s after start." % (monotonic() - T0))
+           while True:
+               sleep(1)
+
+       def stop(self):
+           self.set_mode(MODE.SLEEP)
+
+   return(LoRaGPStx)
+
+
+###################################################################
+
+def main(argv=None):
+
+   args = parseArgs(argv)
+
+   hn = gethostname()
+   # identifier sent in reports, a node id is shorter than most hostnames (less air time)
+   if args.node_id is not None : hn = '#%i' % args.node_id
+
+   logging.info('main thread starting. ' + strftime('%Y-%m-%d %H:%M:%S %Z'))
+
+   shutdown = threading.Event()
+
+   logging.info('starting serialGPS.' )
+   gps = serialGPS(shutdown, port=args.port)
+   gps.start()
+
+   # the GPS thread is not a daemon, so it must be stopped if the radio setup fails
+   # (or start() raises), otherwise the process does not exit and is not restarted.
+   try:
+      logging.info('setting LoRa.' )
+
+      from SX127x.board_config import BOARD
+      LoRaGPStx = loraTransmitter()
+
+      BOARD.setup()
+
+      lora = LoRaGPStx(gps, hn, ReportInterval=args.report, quiet=args.quiet,
+                freq=channels[args.channel], bw=args.bw, Cr=args.Cr, Sf=args.Sf,
+                verbose=False, do_calibration=True, calibration_freq=channels[args.channel])
+
+      #assert(lora.get_freq() == 915)  # in North America just channel 12
+      assert(abs(lora.get_freq() - channels[args.channel]) < 0.0001)
+
+      #assert(lora.get_lna()['lna_gain'] == GAIN.NOT_USED)
+      #assert(lora.get_agc_auto_on() == 1)
+
+      if not args.quiet :
+         print(lora)
+         print("Report interval %f s" % args.report)
+
+      logging.debug(threading.enumerate())
+
+      def shutdownHandler(signum, frame):
+          if not args.quiet : sys.stderr.write("Interrupt.\n")
+          logging.info('main thread setting shutdown signal.')
+          shutdown.set()  # to exit threads
+          sleep(2)
+          logging.info('main thread exit.' + strftime('%Y-%m-%d %H:%M:%S %Z')+ '\n')
+          logging.debug('threads still running:')
+          logging.debug(threading.enumerate())
+          lora.stop()
+          BOARD.teardown()
+          if not args.quiet :
+             sys.stdout.flush()
+             #print(lora)
+             #sys.stdout.flush()
+             sys.stderr.write("Sensor system shut down.\n")
+          sys.exit()
+
+      # ^C works if process is not deamonized with &
+      signal.signal(signal.SIGINT,  shutdownHandler) # ^C, kill -2
+      signal.signal(signal.SIGTERM, shutdownHandler) # kill -15 (default)
+
+      #while True:
+      lora.start()    # lora does loop  Ctrl+c or kill to exit
+   except BaseException:
+      shutdown.set()
+      raise
+
+
+###########################################################################
+####################### unittest  tests  ##################################
+###########################################################################
+
+if __name__ == '__main__':
+
+   import unittest
+
+
+   class TestSensor(unittest.TestCase):
+
+       def test_NMEA(self):
+           p = parseNMEA0183('$GPGGA,181119.00,4523.74678,N,07540.61545,W,1,08,1.13,62.8,M,-34.2,M,,*5F')
+           self.assertAlmostEqual(p[0],  45.395780, places=6)
+           self.assertAlmostEqual(p[1], -75.676924, places=6)
+           self.assertEqual(p[2:], ('18:11:19.00Z', None))
+           p = parseNMEA0183('$GPRMC,181124.00,A,4523.74681,N,07540.61529,W,0.035,,030520,,,A*6C')
+           self.assertEqual(p[2:], ('18:11:24.00Z', '03/05/20'))
+           p = parseNMEA0183('$GPGLL,4523.74678,N,07540.61550,W,181118.00,A,A*70')
+           self.assertEqual(p[2], '18:11:18.00Z')
+           self.assertIsNone(parseNMEA0183('$GPGSV,3,1,11,01,,,30*70'))
+
+       def test_report(self):
+           class GPS(serialGPS):
+               def __init__(self):
+                   self.lat = self.lon = self.tm = self.date = None
+           gps = GPS()
+           gps.update('$GPRMC,181124.00,A,4523.74681,N,07540.61529,W,0.035,,030520,,,A*6C')
+           gps.update('$GPGLL,4523.74678,N,07540.61550,W,181118.00,A,A*70')
+           self.assertEqual(gps.date, '2020-05-03')
+           x = reportText('#3', gps)
+           self.assertEqual(x.split(' ')[0], '#3')
+           self.assertEqual(x.split(' ')[3], '2020-05-03T18:11:18.00Z')
+
+
+   unittest.main()
+
+# run this using
+# python3 lib/sensor.py
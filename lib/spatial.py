@@ -0,0 +1,662 @@
+
+'''
+Proximity, geofence and mark rounding alerts for the base station.
+
+Positions are projected to metres on a local flat plane (equirectangular around
+a reference latitude), which is accurate enough over a race area of a few km.
+Boats are kept in a uniform grid with cells the size of the proximity distance,
+so the boats near a new fix are found in the 3 x 3 cells around it, rather than
+by comparing every pair of boats. Zones (polygons and circles) and marks are put
+in a second grid of larger cells when they are loaded, so each fix is only tested
+against the zones near it. The cost per fix depends on the number of boats and
+zones near the boat, not on the size of the fleet (see  python3 lib/spatial.py bench).
+
+update() returns a list of events (tuples):
+   ('enter', boat, zone)           boat entered zone.
+   ('exit',  boat, zone)           boat left zone.
+   ('near',  boat, other, metres)  boat came within proximity metres of other.
+   ('clear', boat, other)          boat and other are no longer within proximity.
+   ('round', boat, mark, side)     boat rounded mark, side is 'port' or 'starboard'
+                                   (the side of the boat the mark was on).
+A mark is rounded when a boat leaves the circle of radius around the mark after
+both turning (course over ground, from fixes at least min_move metres apart) and
+going around the mark by at least min_turn degrees, in the same direction. A boat
+passing the mark in a straight line goes around it, but does not turn, so this is
+not a rounding. Nor is turning back inside the circle without going around the mark.
+
+The configuration (e.g. GEOFENCES.json) is a json dict, for example
+{
+ "proximity": 20,
+ "zones": [
+   {"name": "channel", "polygon": [[44.2100, -76.5200], [44.2200, -76.5200], [44.2200, -76.5000]]},
+   {"name": "rock",    "circle":  [44.2150, -76.5100, 50]}
+ ],
+ "marks": [
+   {"name": "A", "lat": 44.2160, "lon": -76.5150, "radius": 30}
+ ]
+}
+Polygon points are [lat, lon], circles are [lat, lon, radius], distances in metres.
+
+examples
+# need  export PYTHONPATH=/path/to/LoRaGPS/lib
+
+from spatial import *
+sa = SpatialAlerts.fromFile('GEOFENCES.json')
+sa.update('BT-1', 44.2155, -76.5105)
+'''
+
+import json
+import os
+import sys
+import threading
+from math import cos, sin, radians, atan2, pi, hypot, floor
+from time import monotonic
+
+R_EARTH = 6371000.0    # metres
+
+# errors from a configuration with the wrong content (json that parses)
+CONFIG_ERRORS = (ValueError, TypeError, KeyError, IndexError, AttributeError)
+
+
+class Zone(object):
+    '''
+    Polygon or circle in local (x, y) metres. For a circle pts is [(x, y)] and r
+    the radius, for a polygon pts is the list of vertices and r is None.
+    '''
+    __slots__ = ('name', 'pts', 'r', 'bbox')
+
+    def __init__(self, name, pts, r=None):
+        self.name = name
+        self.pts  = pts
+        self.r    = r
+        if r is None :
+           xs = [p[0] for p in pts]
+           ys = [p[1] for p in pts]
+           self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        else :
+           x, y = pts[0]
+           self.bbox = (x - r, y - r, x + r, y + r)
+
+    def contains(self, x, y):
+        b = self.bbox
+        if not (b[0] <= x <= b[2] and b[1] <= y <= b[3]) : return(False)
+        if self.r is not None :
+           return(hypot(x - self.pts[0][0], y - self.pts[0][1]) <= self.r)
+        # ray casting
+        inside = False
+        pts = self.pts
+        x1, y1 = pts[-1]
+        for x2, y2 in pts:
+            if (y2 > y) != (y1 > y) and x < (x1 - x2) * (y - y2) / (y1 - y2) + x2 :
+               inside = not inside
+            x1, y1 = x2, y2
+        return(inside)
+
+
+class SpatialAlerts(object):
+    '''
+      config      dict as described in the module notes (or None).
+      proximity   metres for 'near' events, overrides config. 0 or None turns them off.
+      lat0        reference latitude for the projection. By default the centre of
+                  the zones and marks, or the first fix.
+      fence_cell  grid cell size in metres for zones and marks.
+      min_turn    degrees a boat must turn, and go around a mark, for a rounding.
+      min_move    metres a boat must move for a new course (less is GPS noise).
+      max_age     seconds after which a boat without fixes is removed by evict().
+      fence_file  json file with the configuration (if config is None). Zones and
+                  marks are re-read by poll() when it changes, proximity is not.
+                  If the file cannot be read or has the wrong content a message is
+                  printed (stderr) and the previous fences (or none) are kept.
+    '''
+
+    def __init__(self, config=None, proximity=None, lat0=None, fence_cell=250.0, min_turn=90.0,
+                 min_move=2.0, max_age=600.0, fence_file=None):
+        self.fence_file = fence_file
+        self._stamp     = None
+        from_file = config is None and fence_file is not None
+        if from_file :
+           stamp = self._fileStamp()
+           config = None
+           if stamp is not None :
+              try:
+                 config = self._readFile()
+                 self._stamp = stamp
+              except (OSError,) + CONFIG_ERRORS as e:
+                 sys.stderr.write('Geofences not loaded: %s\n' % e)
+        config = config or {}
+        if proximity is None :
+           try:
+              proximity = float(config.get('proximity') or 0)
+           except CONFIG_ERRORS as e:
+              if not from_file : raise
+              sys.stderr.write('Geofences proximity not used: %s\n' % e)
+              proximity = 0
+        self.proximity  = proximity
+        self.cell       = float(proximity) if proximity else 100.0
+        self.fence_cell = fence_cell
+        self.min_turn   = radians(min_turn)
+        self.min_move   = min_move
+        self.max_age    = max_age
+
+        self.lat0 = lat0
+        if self.lat0 is None :
+           try:
+              pts = [p for z in config.get('zones', ()) for p in z.get('polygon', [z.get('circle')])]
+              pts += [(m['lat'], m['lon']) for m in config.get('marks', ())]
+              if pts : self.lat0 = sum(float(p[0]) for p in pts) / len(pts)
+           except CONFIG_ERRORS:
+              pass     # reported by setFences
+        self._kx = None if self.lat0 is None else R_EARTH * radians(1) * cos(radians(self.lat0))
+        self._ky = R_EARTH * radians(1)
+
+        self.pos     = {}   # boat -> (x, y, cell)
+        self.grid    = {}   # cell -> set of boats
+        self.near    = {}   # boat -> set of boats within proximity
+        self.inside  = {}   # boat -> set of zone names
+        self.atMark  = {}   # boat -> {mark name: [bearing from mark, angle around mark,
+                            #                      course change, last course]}
+        self.course  = {}   # boat -> (x, y, course) at the last move of min_move
+        self.seen    = {}   # boat -> time of last fix (monotonic)
+        self.zones   = []
+        self.marks   = {}
+        self.fences  = {}
+        # update() runs in the radio callback, setFences() (from poll) in the main loop
+        self._lock   = threading.Lock()
+        try:
+           self.setFences(config)
+        except CONFIG_ERRORS as e:
+           if not from_file : raise
+           self._stamp = None
+           sys.stderr.write('Geofences not loaded: %s\n' % e)
+
+    @classmethod
+    def fromFile(cls, fl, **kw):
+        return(cls(fence_file=fl, **kw))
+
+    def _fileStamp(self):
+        try:
+           st = os.stat(self.fence_file)
+           return((st.st_mtime_ns, st.st_size))
+        except (OSError, TypeError):    # TypeError for fence_file None
+           return(None)
+
+    def _readFile(self):
+        with open(self.fence_file, 'r') as f:  config = json.load(f)
+        if not isinstance(config, dict) :
+           raise TypeError('%s must contain a json dict' % self.fence_file)
+        return(config)
+
+    def poll(self):
+        '''
+        Reload zones and marks if fence_file has changed. Return True if reloaded.
+        If the file cannot be read, parsed, or has the wrong content, the previous
+        fences are kept and the file is read again on the next poll.
+        '''
+        stamp = self._fileStamp()
+        if stamp is None or stamp == self._stamp : return(False)
+        try:
+           self.setFences(self._readFile())
+        except (OSError,) + CONFIG_ERRORS as e:
+           sys.stderr.write('Geofences not reloaded: %s\n' % e)
+           return(False)
+        self._stamp = stamp
+        return(True)
+
+    def xy(self, lat, lon):
+        if self._kx is None :
+           self.lat0 = lat
+           self._kx  = R_EARTH * radians(1) * cos(radians(lat))
+        return(lon * self._kx, lat * self._ky)
+
+    def setFences(self, config):
+        '''
+        (Re)load zones and marks from config. Boat positions are kept, and so are
+        the zones boats are in and the marks with names that are still in config,
+        so a reload does not repeat 'enter' events or lose roundings in progress.
+        A boat in a zone that is removed gets an 'exit' event on its next fix.
+        One of CONFIG_ERRORS is raised if config has the wrong content, and then
+        the previous fences are kept.
+        '''
+        zones = []
+        for z in config.get('zones', ()):
+            name = str(z['name'])
+            if 'circle' in z :
+               lat, lon, r = [float(v) for v in z['circle']]
+               if not r > 0 : raise ValueError('zone %s radius must be > 0' % name)
+               zones.append(Zone(name, [self.xy(lat, lon)], r))
+            elif 'polygon' in z :
+               pts = [self.xy(float(lat), float(lon)) for lat, lon in z['polygon']]
+               if len(pts) < 3 : raise ValueError('zone %s needs at least 3 points' % name)
+               zones.append(Zone(name, pts))
+            else :
+               raise ValueError('zone %s needs a polygon or a circle' % name)
+        marks = []
+        for m in config.get('marks', ()):
+            name = str(m['name'])
+            r = float(m.get('radius', 30))
+            if not r > 0 : raise ValueError('mark %s radius must be > 0' % name)
+            marks.append(Zone(name, [self.xy(float(m['lat']), float(m['lon']))], r))
+
+        # fence grid: cell -> list of (Zone, is_mark) whose bounding box overlaps the cell
+        fc = self.fence_cell
+        fences = {}
+        for z, is_mark in [(z, False) for z in zones] + [(m, True) for m in marks]:
+            b = z.bbox
+            for i in range(int(floor(b[0] / fc)), int(floor(b[2] / fc)) + 1):
+                for j in range(int(floor(b[1] / fc)), int(floor(b[3] / fc)) + 1):
+                    fences.setdefault((i, j), []).append((z, is_mark))
+
+        mn = set(m.name for m in marks)
+        with self._lock:
+           for d in self.atMark.values():
+               for n in [n for n in d if n not in mn] : del d[n]
+           self.zones  = zones
+           self.marks  = dict((m.name, m) for m in marks)
+           self.fences = fences
+
+    ############# per fix
+
+    def update(self, boat, lat, lon, now=None):
+        '''
+        Record a fix for boat and return the list of events it causes.
+        now (monotonic seconds) is for evict().
+        '''
+        if now is None : now = monotonic()
+        x, y = self.xy(lat, lon)
+        events = []
+        with self._lock:
+           self.seen[boat] = now
+           if self.proximity : self._proximity(boat, x, y, events)
+           # also with no fences, if the boat was in zones removed by a reload (exit events)
+           if self.fences or self.inside.get(boat) or self.atMark.get(boat) :
+              self._fences(boat, x, y, events)
+        return(events)
+
+    def _proximity(self, boat, x, y, events):
+        c = self.cell
+        ij = (int(floor(x / c)), int(floor(y / c)))
+        old = self.pos.get(boat)
+        if old is None or old[2] != ij :
+           if old is not None :
+              s = self.grid[old[2]]
+              s.discard(boat)
+              if not s : del self.grid[old[2]]
+           self.grid.setdefault(ij, set()).add(boat)
+        self.pos[boat] = (x, y, ij)
+
+        near = set()
+        pos  = self.pos
+        grid = self.grid
+        r    = self.proximity
+        for i in (ij[0] - 1, ij[0], ij[0] + 1):
+            for j in (ij[1] - 1, ij[1], ij[1] + 1):
+                for b in grid.get((i, j), ()):
+                    if b == boat : continue
+                    p = pos[b]
+                    d = hypot(p[0] - x, p[1] - y)
+                    if d <= r :
+                       near.add(b)
+                       if b not in self.near.get(boat, ()) :
+                          events.append(('near', boat, b, round(d, 1)))
+
+        for b in self.near.get(boat, set()) - near:
+            events.append(('clear', boat, b))
+            self.near[b].discard(boat)
+        for b in near:
+            self.near.setdefault(b, set()).add(boat)
+        self.near[boat] = near
+
+    def _course(self, boat, x, y):
+        # course (radians, x east, y north) of the last move of at least min_move,
+        # and True if this fix is a new move
+        c = self.course.get(boat)
+        if c is None :
+           self.course[boat] = (x, y, None)
+           return(None, False)
+        if hypot(x - c[0], y - c[1]) < self.min_move : return(c[2], False)
+        a = atan2(y - c[1], x - c[0])
+        self.course[boat] = (x, y, a)
+        return(a, True)
+
+    def _fences(self, boat, x, y, events):
+        fc = self.fence_cell
+        cand = self.fences.get((int(floor(x / fc)), int(floor(y / fc))), ())
+        mk   = self.marks
+
+        course, moved = self._course(boat, x, y)
+        marks = self.atMark.setdefault(boat, {})
+        if moved :
+           for m in marks.values():
+               if m[3] is not None : m[2] += _wrap(course - m[3])
+               m[3] = course
+
+        was = self.inside.get(boat, set())
+        now = set()
+        for z, is_mark in cand:
+            if not z.contains(x, y) : continue
+            if is_mark :
+               a = atan2(y - z.pts[0][1], x - z.pts[0][0])
+               m = marks.get(z.name)
+               if m is None :
+                  marks[z.name] = [a, 0.0, 0.0, course]
+               else :
+                  m[1] += _wrap(a - m[0])
+                  m[0] = a
+            else :
+               now.add(z.name)
+
+        for name in sorted(now - was):
+            events.append(('enter', boat, name))
+        for name in sorted(was - now):
+            events.append(('exit', boat, name))
+        self.inside[boat] = now
+
+        for name in [n for n in marks if n not in mk or not mk[n].contains(x, y)]:
+            m = marks.pop(name)
+            around, turned = m[1], m[2]
+            if abs(turned) >= self.min_turn and abs(around) >= self.min_turn and \
+               around * turned > 0 :
+               # turning counter clockwise (x east, y north) around the mark has it to port
+               events.append(('round', boat, name, 'port' if turned > 0 else 'starboard'))
+
+    def remove(self, boat):
+        '''
+        Forget boat (e.g. no longer reporting). Returns 'clear' events.
+        '''
+        with self._lock:
+           return(self._remove(boat))
+
+    def evict(self, now=None):
+        '''
+        Remove boats without fixes within max_age seconds (e.g. turned off or
+        ashore), so they do not give 'near' events where they were last seen.
+        Returns their 'clear' events. Call periodically.
+        '''
+        if now is None : now = monotonic()
+        events = []
+        with self._lock:
+           for b in [b for b, t in self.seen.items() if now - t > self.max_age]:
+               events += self._remove(b)
+        return(events)
+
+    def _remove(self, boat):
+        events = []
+        old = self.pos.pop(boat, None)
+        if old is not None :
+           s = self.grid[old[2]]
+           s.discard(boat)
+           if not s : del self.grid[old[2]]
+        for b in self.near.pop(boat, ()):
+            self.near[b].discard(boat)
+            events.append(('clear', boat, b))
+        self.inside.pop(boat, None)
+        self.atMark.pop(boat, None)
+        self.course.pop(boat, None)
+        self.seen.pop(boat, None)
+        return(events)
+
+
+def _wrap(a):
+   # angle in (-pi, pi]
+   if a >   pi : a -= 2 * pi
+   if a <= -pi : a += 2 * pi
+   return(a)
+
+
+def formatEvent(ev):
+   '''
+   Printable line for an event.
+   '''
+   if ev[0] == 'near' :
+      return('ALERT near  %s %s %.1f m' % ev[1:])
+   return('ALERT %-5s %s' % (ev[0], ' '.join(str(x) for x in ev[1:])))
+
+
+###########################################################################
+########################### benchmark #####################################
+###########################################################################
+
+def bench(fleets=(100, 500, 1000, 2000), fixes=20000, proximity=20.0, density=400):
+   '''
+   Time per fix for fleets of simulated boats doing random walks, with a zone and
+   marks. The area grows with the fleet (density boats per km2), as a larger
+   fleet is spread over a larger course. The all pairs comparison is shown for
+   reference.
+   '''
+   import random
+   from time import perf_counter
+
+   print('%8s %14s %14s %10s' % ('boats', 'grid us/fix', 'pairs us/fix', 'events'))
+   for n in fleets:
+       random.seed(1)
+       side = (n / density) ** 0.5 * 1000.0                # metres
+       lat0, lon0 = 44.2, -76.5
+       dlat = side / (R_EARTH * radians(1))
+       dlon = dlat / cos(radians(lat0))
+       cfg = {'zones': [{'name': 'Z', 'polygon': [[lat0 + dlat / 3, lon0 + dlon / 3],
+                          [lat0 + dlat / 2, lon0 + dlon / 3], [lat0 + dlat / 2, lon0 + dlon / 2]]}],
+              'marks': [{'name': 'M%i' % k, 'lat': lat0 + random.random() * dlat,
+                         'lon': lon0 + random.random() * dlon, 'radius': 30} for k in range(5)]}
+       boats = [[lat0 + random.random() * dlat, lon0 + random.random() * dlon] for i in range(n)]
+       names = ['BT-%i' % i for i in range(n)]
+       sa = SpatialAlerts(cfg, proximity=proximity)
+       for i in range(n): sa.update(names[i], boats[i][0], boats[i][1])
+
+       step = 5.0 / (R_EARTH * radians(1))
+       moves = []
+       for k in range(fixes):
+           i = random.randrange(n)
+           boats[i][0] += random.uniform(-step, step)
+           boats[i][1] += random.uniform(-step, step)
+           moves.append((names[i], boats[i][0], boats[i][1]))
+
+       nev = 0
+       t = perf_counter()
+       for b, lat, lon in moves: nev += len(sa.update(b, lat, lon))
+       grid = (perf_counter() - t) / fixes * 1e6
+
+       # all pairs: distance from the fix to every other boat
+       xy = dict((names[i], sa.xy(boats[i][0], boats[i][1])) for i in range(n))
+       m = min(fixes, 2000)
+       t = perf_counter()
+       for b, lat, lon in moves[:m]:
+           x, y = sa.xy(lat, lon)
+           close = [o for o, p in xy.items() if o != b and hypot(p[0] - x, p[1] - y) <= proximity]
+       pairs = (perf_counter() - t) / m * 1e6
+
+       print('%8i %14.1f %14.1f %10i' % (n, grid, pairs, nev))
+
+
+###########################################################################
+####################### unittest  tests  ##################################
+###########################################################################
+
+if __name__ == '__main__':
+
+   import sys
+   import os
+   import random
+   import tempfile
+   import unittest
+
+
+   CFG = {"proximity": 20,
+          "zones": [
+             {"name": "channel", "polygon": [[44.2100, -76.5200], [44.2200, -76.5200],
+                                             [44.2200, -76.5000], [44.2100, -76.5000]]},
+             {"name": "rock",    "circle":  [44.2300, -76.5100, 50]}],
+          "marks": [{"name": "A", "lat": 44.2400, "lon": -76.5150, "radius": 30}]}
+
+   # about 1 m in degrees of latitude and of longitude at 44.2
+   M_LAT = 1 / (R_EARTH * radians(1))
+   M_LON = M_LAT / cos(radians(44.2))
+
+
+   class TestSpatial(unittest.TestCase):
+
+       def test_zones(self):
+           sa = SpatialAlerts(CFG)
+           self.assertEqual(sa.update('BT-1', 44.2050, -76.5100), [])
+           self.assertEqual(sa.update('BT-1', 44.2150, -76.5100), [('enter', 'BT-1', 'channel')])
+           self.assertEqual(sa.update('BT-1', 44.2160, -76.5100), [])
+           self.assertEqual(sa.update('BT-1', 44.2250, -76.5100), [('exit', 'BT-1', 'channel')])
+           self.assertEqual(sa.update('BT-1', 44.2300 + 40 * M_LAT, -76.5100),
+                            [('enter', 'BT-1', 'rock')])
+           self.assertEqual(sa.update('BT-1', 44.2300 + 60 * M_LAT, -76.5100),
+                            [('exit', 'BT-1', 'rock')])
+
+       def test_proximity(self):
+           sa = SpatialAlerts(CFG)
+           sa.update('BT-1', 44.2500, -76.5000)
+           ev = sa.update('BT-2', 44.2500 + 15 * M_LAT, -76.5000)
+           self.assertEqual([e[:3] for e in ev], [('near', 'BT-2', 'BT-1')])
+           self.assertAlmostEqual(ev[0][3], 15.0, places=0)
+           self.assertEqual(sa.update('BT-2', 44.2500 + 16 * M_LAT, -76.5000), [])
+           self.assertEqual(sa.update('BT-1', 44.2500 - 10 * M_LAT, -76.5000),
+                            [('clear', 'BT-1', 'BT-2')])
+           self.assertEqual(sa.near, {'BT-1': set(), 'BT-2': set()})
+           sa.update('BT-1', 44.2500 + 30 * M_LAT, -76.5000 + 5 * M_LON)
+           self.assertEqual(sa.remove('BT-2'), [('clear', 'BT-2', 'BT-1')])
+           self.assertEqual(sa.near['BT-1'], set())
+
+       def test_round(self):
+           sa = SpatialAlerts(CFG, proximity=0)
+           A = (44.2400, -76.5150)     # radius 30
+           def sail(boat, pts):
+               # pts are (east, north) metres from A, return the events
+               ev = []
+               for e, n in pts:
+                   ev += sa.update(boat, A[0] + n * M_LAT, A[1] + e * M_LON)
+               return(ev)
+           up    = [(20, n) for n in (-80, -60, -40, -20)]
+           down  = [(-20, n) for n in (-20, -40, -60, -80)]
+           arc   = [(20 * cos(radians(a)), 20 * sin(radians(a))) for a in range(0, 181, 30)]
+           # north on the east side, counter clockwise around A, back south: mark to port
+           self.assertEqual(sail('BT-1', up + arc + down), [('round', 'BT-1', 'A', 'port')])
+           # the mirror image, clockwise: mark to starboard
+           mirror = lambda pts: [(-e, n) for e, n in pts]
+           self.assertEqual(sail('BT-2', mirror(up + arc + down)),
+                            [('round', 'BT-2', 'A', 'starboard')])
+           # straight past the mark, at 5, 15 and 20 m, is not a rounding
+           for d in (5, 15, 20, -5):
+               self.assertEqual(sail('BT-3%i' % d, [(d, n) for n in range(-80, 81, 10)]), [])
+           # turning back inside the circle without going around the mark
+           self.assertEqual(sail('BT-4', up + [(20, -10), (18, -20)] + [(16, n) for n in (-40, -60, -80)]), [])
+           # GPS noise while stopped at the mark does not add turns
+           noise = [(20 + (k % 2), -10 + (k % 3)) for k in range(30)]
+           self.assertEqual(sail('BT-5', up + noise + [(20, -40), (20, -60)]), [])
+
+       def test_evict(self):
+           sa = SpatialAlerts(CFG, max_age=60)
+           sa.update('BT-1', 44.2150, -76.5100, now=0.0)
+           sa.update('BT-2', 44.2150 + 10 * M_LAT, -76.5100, now=50.0)
+           self.assertEqual(sa.evict(now=100.0), [('clear', 'BT-1', 'BT-2')])
+           for d in (sa.pos, sa.near, sa.inside, sa.atMark, sa.course, sa.seen):
+               self.assertNotIn('BT-1', d)
+           self.assertEqual(sum(len(s) for s in sa.grid.values()), 1)
+           # a boat passing where BT-1 was is not near it
+           self.assertEqual(sa.update('BT-3', 44.2150, -76.5100, now=101.0)[:1],
+                            [('near', 'BT-3', 'BT-2', 10.0)])
+           self.assertEqual(sa.evict(now=111.0), [('clear', 'BT-2', 'BT-3')])
+           self.assertEqual(list(sa.seen), ['BT-3'])
+
+       def test_grid(self):
+           # same pairs as comparing all pairs
+           random.seed(2)
+           sa = SpatialAlerts(proximity=25.0)
+           pts = {}
+           for k in range(3000):
+               b = 'BT-%i' % random.randrange(60)
+               pts[b] = (44.2 + random.random() * 200 * M_LAT, -76.5 + random.random() * 200 * M_LON)
+               sa.update(b, *pts[b])
+           xy = dict((b, sa.xy(*p)) for b, p in pts.items())
+           for b in pts:
+               near = set(o for o in pts if o != b and
+                          hypot(xy[o][0] - xy[b][0], xy[o][1] - xy[b][1]) <= 25.0)
+               self.assertEqual(sa.near[b], near)
+
+       def test_file(self):
+           with tempfile.TemporaryDirectory() as d:
+              fl = os.path.join(d, 'GEOFENCES.json')
+              with open(fl, 'w') as f:  json.dump(CFG, f)
+              sa = SpatialAlerts.fromFile(fl, proximity=0)
+              self.assertEqual(sa.proximity, 0)
+              self.assertEqual(sorted(z.name for z in sa.zones), ['channel', 'rock'])
+              self.assertEqual(sa.update('BT-1', 44.2150, -76.5100), [('enter', 'BT-1', 'channel')])
+              self.assertFalse(sa.poll())
+              with open(fl, 'w') as f:  f.write('{"zones": [')    # being edited
+              self.assertFalse(sa.poll())
+              with open(fl, 'w') as f:  json.dump({"zones": CFG["zones"][1:]}, f)
+              os.utime(fl, ns=(0, 0))
+              self.assertTrue(sa.poll())
+              self.assertEqual([z.name for z in sa.zones], ['rock'])
+              # BT-1 was in channel, which is gone, it is not in rock
+              self.assertEqual(sa.update('BT-1', 44.2160, -76.5100), [('exit', 'BT-1', 'channel')])
+
+       def test_reload_state(self):
+           # a reload does not repeat enter events or lose a rounding in progress
+           sa = SpatialAlerts(CFG, proximity=0)
+           A = (44.2400, -76.5150)
+           sa.update('BT-1', 44.2150, -76.5100)
+           for n in (-80, -60, -40, -20):
+               sa.update('BT-2', A[0] + n * M_LAT, A[1] + 20 * M_LON)
+           cfg = dict(CFG, zones=CFG['zones'] + [{"name": "new", "circle": [44.2150, -76.5100, 10]}])
+           sa.setFences(cfg)
+           self.assertEqual(sa.update('BT-1', 44.21505, -76.5100), [('enter', 'BT-1', 'new')])
+           ev = []
+           for a in range(0, 181, 30):
+               ev += sa.update('BT-2', A[0] + 20 * sin(radians(a)) * M_LAT,
+                                       A[1] + 20 * cos(radians(a)) * M_LON)
+               if a == 90 : sa.setFences(cfg)
+           for n in (-20, -40, -60):
+               ev += sa.update('BT-2', A[0] + n * M_LAT, A[1] - 20 * M_LON)
+           self.assertEqual(ev, [('round', 'BT-2', 'A', 'port')])
+           # removing all zones and marks gives exit events
+           sa.setFences({})
+           self.assertEqual(sa.update('BT-1', 44.21505, -76.5100),
+                            [('exit', 'BT-1', 'channel'), ('exit', 'BT-1', 'new')])
+           self.assertEqual(sa.update('BT-1', 44.21505, -76.5100), [])
+
+       def test_bad_file(self):
+           # json that parses but has the wrong content keeps the previous fences
+           stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+           try:
+              with tempfile.TemporaryDirectory() as d:
+                 fl = os.path.join(d, 'GEOFENCES.json')
+                 sa = SpatialAlerts.fromFile(fl)            # does not exist yet
+                 self.assertEqual(sa.zones, [])
+                 with open(fl, 'w') as f:  json.dump(CFG, f)
+                 self.assertTrue(sa.poll())
+                 for k, bad in enumerate((
+                    {"zones": [{"name": "a", "circle": [44.2, -76.5]}]},
+                    {"zones": [{"circle": [44.2, -76.5, 10]}]},
+                    {"zones": [{"name": "a"}]},
+                    {"zones": [{"name": "a", "polygon": [[44.2, -76.5], [44.3, -76.5]]}]},
+                    {"zones": [{"name": "a", "polygon": [[44.2], [44.3, -76.5], [44.3, -76.4]]}]},
+                    {"marks": [{"name": "A", "lat": "north", "lon": -76.5}]},
+                    {"marks": [{"name": "A", "lat": 44.2}]},
+                    {"zones": {"name": "a"}},
+                    ["zones"])):
+                     with open(fl, 'w') as f:  json.dump(bad, f)
+                     os.utime(fl, ns=(k, k))
+                     self.assertFalse(sa.poll(), bad)
+                     self.assertEqual(sorted(z.name for z in sa.zones), ['channel', 'rock'])
+                     self.assertEqual(sorted(sa.marks), ['A'])
+                 sa = SpatialAlerts.fromFile(fl)            # bad at start
+                 self.assertEqual(sa.zones, [])
+              self.assertRaises(ValueError, SpatialAlerts, {"zones": [{"name": "a"}]})
+           finally:
+              sys.stderr.close()
+              sys.stderr = stderr
+           self.assertEqual(formatEvent(('near', 'BT-1', 'BT-2', 12.34)), 'ALERT near  BT-1 BT-2 12.3 m')
+
+
+   if len(sys.argv) > 1 and sys.argv[1] == 'bench' :
+      bench()
+   else :
+      unittest.main()
+
+# run this using
+# python3 lib/spatial.py
+# and the benchmark with
+# python3 lib/spatial.py bench
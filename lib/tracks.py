@@ -0,0 +1,113 @@
+
+'''
+Read track files as written by LoRaGPS_base in TRACKS_time_stamp/ directories.
+
+A track record is a line like
+   BT-1 45.395798 -75.676875 2020-5-20 23:18:59.0Z  dt=13.0 s
+which parseTrackRecord converts to a tuple (t, hostname, lat, lon, sec) where
+t is seconds since the epoch (UTC) and sec is the seconds part of the time stamp.
+
+mergeTracks merges the records of several files in time order. It uses a heap
+(heapq.merge) so only one record per file is held in memory, which matters for
+long recordings of a large fleet.
+
+examples
+# need  export PYTHONPATH=/path/to/LoRaGPS/lib
+
+from tracks import *
+trackFiles(['TRACKS_2020-05-20_19:00:00'])
+for t, bt, lat, lon, sec in mergeTracks(trackFiles(['TRACKS_2020-05-20_19:00:00'])):
+    print(t, bt, lat, lon)
+'''
+
+import os
+import heapq
+from calendar import timegm
+
+
+def parseTrackRecord(ln):
+   '''
+   Return (t, hostname, lat, lon, sec) for a track record, or None if the line
+   cannot be parsed.
+   '''
+   p = ln.split()
+   try:
+      dt  = [int(x) for x in p[3].split('-')]
+      tm  = p[4].replace('Z', '').split(':')
+      sec = float(tm[2])
+      t   = timegm((dt[0], dt[1], dt[2], int(tm[0]), int(tm[1]), 0)) + sec
+      return((t, p[0], float(p[1]), float(p[2]), sec))
+   except (IndexError, ValueError):
+      return(None)
+
+
+def readTrack(fl):
+   '''
+   Generator of the parsed records in track file fl. Lines that cannot be parsed
+   are skipped.
+   '''
+   with open(fl, 'r') as f:
+      for ln in f:
+         r = parseTrackRecord(ln)
+         if r is not None : yield(r)
+
+
+def trackFiles(paths):
+   '''
+   Expand a list of track files and TRACKS_* directories into a list of track files.
+   '''
+   fls = []
+   for p in paths:
+       if os.path.isdir(p) :
+          fls.extend(os.path.join(p, f) for f in sorted(os.listdir(p)) if f.endswith('.txt'))
+       else :
+          fls.append(p)
+   return(fls)
+
+
+def mergeTracks(fls):
+   '''
+   Generator of the records of all track files in fls in time order (k-way merge).
+   '''
+   return(heapq.merge(*[readTrack(f) for f in fls]))
+
+
+###########################################################################
+####################### unittest  tests  ##################################
+###########################################################################
+
+if __name__ == '__main__':
+
+   import unittest
+   import tempfile
+
+
+   class TestTracks(unittest.TestCase):
+
+       def test_parse(self):
+           r = parseTrackRecord('BT-1 45.395798 -75.676875 2020-5-20 23:18:59.0Z  dt=13.0 s')
+           self.assertEqual(r, (1590016739.0, 'BT-1', 45.395798, -75.676875, 59.0))
+           self.assertIsNone(parseTrackRecord('BT-1 45.395798'))
+           self.assertIsNone(parseTrackRecord(''))
+
+       def test_merge(self):
+           with tempfile.TemporaryDirectory() as d:
+              with open(os.path.join(d, 'BT-1.txt'), 'w') as f:
+                 f.write('BT-1 45.0 -75.0 2020-5-20 23:18:59.0Z  dt=13.0 s\n')
+                 f.write('BT-1 45.1 -75.1 2020-5-20 23:19:14.0Z  dt=15.0 s\n')
+                 f.write('garbage\n')
+              with open(os.path.join(d, 'BT-2.txt'), 'w') as f:
+                 f.write('BT-2 46.0 -76.0 2020-5-20 23:19:0.5Z  dt=13.0 s\n')
+                 f.write('BT-2 46.1 -76.1 2020-5-21 0:0:0.0Z  dt=15.0 s\n')
+              with open(os.path.join(d, 'notes'), 'w') as f:  f.write('x\n')
+              fls = trackFiles([d])
+              self.assertEqual(len(fls), 2)
+              r = list(mergeTracks(fls))
+           self.assertEqual([x[1] for x in r], ['BT-1', 'BT-2', 'BT-1', 'BT-2'])
+           self.assertEqual(r[1][0] - r[0][0], 1.5)
+
+
+   unittest.main()
+
+# run this using
+# python3 lib/tracks.py
@@ -0,0 +1,324 @@
+
+'''
+In-memory table of vessel positions built from AIS sentences.
+
+This is used by ais-ingest-udp.py to combine the pseudo AIS from LoRaGPS_base
+with the feed from a real AIS receiver into one picture. The sentence handling
+(checksum, multi-sentence datagrams, decoding with AIS.py) is in AISingest,
+which does not use sockets so it can be tested and used with other inputs.
+
+Only position reports of type 1, 2 and 3 are decoded. Other message types and
+multi fragment messages are counted but not decoded. The message type and MMSI
+are checked with AISpayload_peek before the payload is decoded, and then only the
+fields used here are decoded (AIS1record).
+
+examples
+# need  export PYTHONPATH=/path/to/LoRaGPS/lib
+
+from vessels import *
+ing = AISingest(VesselTable(max_age=600))
+ing.datagram(b'!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23\\r\\n', source='ais')
+ing.table.get(227006760)
+ing.stats
+'''
+
+from time import monotonic
+
+from AIS import AISpayload_peek, AIS1record
+
+
+class Vessel(object):
+    '''
+    Last reported position of a vessel. Attributes are
+      mmsi, lat, lon, sog, cog, hdg  as decoded (sog, cog, hdg may be NA values).
+      t         monotonic time of the last update.
+      source    input the last update came from (e.g. 'lora', 'ais').
+      reports   number of (non duplicate) updates.
+    '''
+    __slots__ = ('mmsi', 'lat', 'lon', 'sog', 'cog', 'hdg', 't', 'source', 'reports')
+
+    def __init__(self, mmsi):
+        self.mmsi    = mmsi
+        self.lat     = None
+        self.lon     = None
+        self.sog     = None
+        self.cog     = None
+        self.hdg     = None
+        self.t       = 0.0
+        self.source  = None
+        self.reports = 0
+
+    def age(self, now=None):
+        return((monotonic() if now is None else now) - self.t)
+
+    def __repr__(self):
+        return('Vessel(%i, lat=%r, lon=%r, source=%r, reports=%i)' %
+           (self.mmsi, self.lat, self.lon, self.source, self.reports))
+
+
+class VesselTable(object):
+    '''
+      max_age     seconds after which a vessel without updates is evicted.
+      dup_window  an update with the same position as the previous one for the
+                  vessel within this many seconds is counted as a duplicate (e.g.
+                  the same report heard by two receivers or on two groups).
+    '''
+
+    def __init__(self, max_age=600.0, dup_window=5.0):
+        self.max_age    = max_age
+        self.dup_window = dup_window
+        self.vessels    = {}    # mmsi -> Vessel
+        self.duplicates = 0
+        self.evicted    = 0
+
+    def update(self, mmsi, lat, lon, sog=None, cog=None, hdg=None, source=None, now=None):
+        '''
+        Record a position. Return False if it is a duplicate, otherwise True.
+        '''
+        if now is None : now = monotonic()
+        v = self.vessels.get(mmsi)
+        if v is None :
+           v = self.vessels[mmsi] = Vessel(mmsi)
+        elif v.lat == lat and v.lon == lon and now - v.t < self.dup_window :
+           self.duplicates += 1
+           return(False)
+
+        v.lat     = lat
+        v.lon     = lon
+        v.sog     = sog
+        v.cog     = cog
+        v.hdg     = hdg
+        v.t       = now
+        v.source  = source
+        v.reports += 1
+        return(True)
+
+    def evict(self, now=None):
+        '''
+        Remove vessels not updated within max_age seconds. Return the number removed.
+        '''
+        if now is None : now = monotonic()
+        old = [m for m, v in self.vessels.items() if now - v.t > self.max_age]
+        for m in old : del self.vessels[m]
+        self.evicted += len(old)
+        return(len(old))
+
+    def get(self, mmsi):
+        return(self.vessels.get(mmsi))
+
+    def __len__(self):
+        return(len(self.vessels))
+
+    def __iter__(self):
+        return(iter(list(self.vessels.values())))
+
+    def lines(self, now=None):
+        '''
+        Return the table as a list of printable lines, most recent first.
+        '''
+        if now is None : now = monotonic()
+        vs = sorted(self.vessels.values(), key=lambda v: -v.t)
+        return(['%9i %12.6f %12.6f %7.1fs %-5s %i' %
+                (v.mmsi, v.lat, v.lon, now - v.t, v.source, v.reports) for v in vs])
+
+
+class AISingest(object):
+    '''
+    Split datagrams (or stream data) into sentences, check them, decode position
+    reports and update table. Counts are kept in stats (a dict).
+
+      table       VesselTable to update.
+      dup_window  identical sentences seen again within this many seconds are
+                  dropped before decoding.
+      forward     None or a function called with each accepted sentence (str),
+                  e.g. to multicast the de-duplicated stream.
+      mmsis       None or a set of MMSIs. Reports from other vessels are dropped
+                  before decoding.
+    '''
+
+    STATS = ('datagrams', 'sentences', 'decoded', 'checksum', 'malformed',
+             'fragments', 'other_types', 'filtered', 'no_position', 'duplicates')
+
+    def __init__(self, table, dup_window=2.0, forward=None, mmsis=None):
+        self.table      = table
+        self.dup_window = dup_window
+        self.forward    = forward
+        self.mmsis      = None if mmsis is None else frozenset(mmsis)
+        self.stats      = dict((k, 0) for k in self.STATS)
+        self._seen      = {}   # payload -> time, for sentence level de-duplication
+
+    def datagram(self, data, source=None, now=None):
+        '''
+        Process bytes containing one or more sentences separated by newlines.
+        '''
+        if now is None : now = monotonic()
+        self.stats['datagrams'] += 1
+        for s in data.decode('ascii', 'ignore').split('\n'):
+            s = s.strip()
+            if s : self.sentence(s, source=source, now=now)
+
+    def sentence(self, s, source=None, now=None):
+        '''
+        Process one sentence, e.g. '!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23'
+        Return True if the table was updated.
+        '''
+        st = self.stats
+        st['sentences'] += 1
+
+        star = s.rfind('*')
+        if s[:1] != '!' or star < 0 :
+           st['malformed'] += 1
+           return(False)
+
+        body = s[1:star]
+        c = 0
+        for ch in body : c ^= ord(ch)
+        try:
+           ok = c == int(s[star+1:star+3], 16)
+        except ValueError:
+           ok = False
+        if not ok :
+           st['checksum'] += 1
+           return(False)
+
+        f = body.split(',')
+        if len(f) < 7 or f[0][2:] not in ('VDM', 'VDO') :
+           st['malformed'] += 1
+           return(False)
+        if f[1] != '1' :
+           st['fragments'] += 1
+           return(False)
+
+        p = f[5]
+        try:
+           typ, mmsi = AISpayload_peek(p)
+        except ValueError:
+           st['malformed'] += 1
+           return(False)
+        if typ not in (1, 2, 3) :
+           st['other_types'] += 1
+           return(False)
+        if self.mmsis is not None and mmsi not in self.mmsis :
+           st['filtered'] += 1
+           return(False)
+
+        if now is None : now = monotonic()
+        t = self._seen.get(p)
+        if t is not None and now - t < self.dup_window :
+           st['duplicates'] += 1
+           return(False)
+        self._seen[p] = now
+
+        try:
+           r = AIS1record(p)
+        except ValueError:
+           st['malformed'] += 1
+           return(False)
+
+        lon = r.lon
+        lat = r.lat
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90) :
+           st['no_position'] += 1
+           return(False)
+
+        st['decoded'] += 1
+        if not self.table.update(mmsi, lat, lon, sog=r.SOG, cog=r.COG, hdg=r.HDG,
+                                 source=source, now=now) :
+           st['duplicates'] += 1
+           return(False)
+
+        if self.forward is not None : self.forward(s)
+        return(True)
+
+    def prune(self, now=None):
+        '''
+        Forget sentences older than dup_window. Call periodically.
+        '''
+        if now is None : now = monotonic()
+        w = self.dup_window
+        self._seen = dict((p, t) for p, t in self._seen.items() if now - t < w)
+
+
+###########################################################################
+####################### unittest  tests  ##################################
+###########################################################################
+
+if __name__ == '__main__':
+
+   import unittest
+
+   from AIS import AIS1_encode
+
+
+   class TestVessels(unittest.TestCase):
+
+       def test_table(self):
+           tb = VesselTable(max_age=60, dup_window=5)
+           self.assertTrue(tb.update(316456789, 44.2, -76.5, source='lora', now=100.0))
+           self.assertFalse(tb.update(316456789, 44.2, -76.5, source='ais', now=101.0))
+           self.assertEqual(tb.duplicates, 1)
+           self.assertTrue(tb.update(316456789, 44.2, -76.5, source='ais', now=106.0))
+           self.assertTrue(tb.update(338654321, 44.3, -76.4, now=120.0))
+           self.assertEqual(tb.get(316456789).reports, 2)
+           self.assertEqual(tb.get(316456789).age(now=110.0), 4.0)
+           self.assertEqual(tb.evict(now=170.0), 1)
+           self.assertIsNone(tb.get(316456789))
+           self.assertEqual(len(tb), 1)
+           self.assertEqual(len(tb.lines(now=170.0)), 1)
+
+       def test_ingest(self):
+           ing = AISingest(VesselTable())
+           a = AIS1_encode(mmsi=316456789, navStat=0, lon=-76.514790, lat=44.215940, tm=15)
+           b = '!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23'
+           ing.datagram((a + '\r\n' + b + '\r\n' + b + '\r\n').encode(), source='lora', now=1.0)
+           self.assertEqual(ing.stats['sentences'], 3)
+           self.assertEqual(ing.stats['decoded'], 2)
+           self.assertEqual(ing.stats['duplicates'], 1)
+           self.assertAlmostEqual(ing.table.get(316456789).lat, 44.215940, places=5)
+           self.assertAlmostEqual(ing.table.get(227006760).lon, 0.1313800, places=5)
+           ing.prune(now=3.5)
+           self.assertFalse(ing.sentence(b, now=4.0))   # same position in table
+           self.assertEqual(ing.table.duplicates, 1)
+
+       def test_rejects(self):
+           ing = AISingest(VesselTable())
+           ing.sentence('!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*24')
+           ing.sentence('AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0')
+           ing.sentence(_nmea('AIVDM,2,1,3,A,55P5TL01VIaAL@7WKO@mBplU@<PDhh000000001S;AJ::4A80?4i@E53,0'))
+           ing.sentence(_nmea('AIVDM,1,1,,B,B6CdCm0t3`tba35f@V9faHi7kP06,0'))
+           ing.sentence(_nmea('AIVDM,1,1,,A,' +
+              AIS1_encode(mmsi=316456789, returnk=False).split(',')[5] + ',0'))
+           for k in ('checksum', 'malformed', 'fragments', 'other_types', 'no_position'):
+               self.assertEqual(ing.stats[k], 1, k)
+           self.assertEqual(len(ing.table), 0)
+
+       def test_filter(self):
+           ing = AISingest(VesselTable(), mmsis=[227006760])
+           ing.sentence('!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23')
+           ing.sentence('!AIVDM,1,1,,A,133sVfPP00PD>hRMDH@jNOvN20S8,0*7F')
+           ing.sentence(_nmea('AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05I,0'))
+           self.assertEqual(ing.stats['filtered'], 1)
+           self.assertEqual(ing.stats['malformed'], 1)
+           self.assertEqual([v.mmsi for v in ing.table], [227006760])
+           self.assertEqual(ing.table.get(227006760).cog, 36.7)
+
+       def test_forward(self):
+           out = []
+           ing = AISingest(VesselTable(), forward=out.append)
+           b = '!AIVDM,1,1,,A,13HOI:0P0000VOHLCnHQKwvL05Ip,0*23'
+           ing.sentence(b)
+           ing.sentence(b)
+           self.assertEqual(out, [b])
+
+
+   def _nmea(body):
+       # add '!' and a (two digit) checksum
+       c = 0
+       for ch in body : c ^= ord(ch)
+       return('!%s*%02X' % (body, c))
+
+
+   unittest.main()
+
+# run this using
+# python3 lib/vessels.py